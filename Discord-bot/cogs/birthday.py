@@ -1,10 +1,14 @@
 # cogs/birthday.py
 import discord
-from discord.ext import commands, tasks
-from datetime import datetime, timedelta
-from typing import Optional, List, Tuple
-import sqlite3
-from utils.database import Database
+from discord.ext import commands
+import asyncio
+import random
+from datetime import date, datetime, timezone, tzinfo
+from typing import Optional, List, Tuple, Dict
+from utils.scheduler import resolve_timezone, local_today, next_midnight
+from utils.roles import RoleReconciler
+from utils.members import fetch_members
+from config.constants import BIRTHDAY_SETTINGS, BIRTHDAY_MESSAGES
 
 def is_admin_or_owner():
     async def predicate(ctx):
@@ -22,24 +26,34 @@ class Birthday(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        self.birthday_check.start()
-        self.role_manager.start()
+        self.db = bot.db
+        self.last_runs = {}
+        self.reschedule = asyncio.Event()
+        self.reconciler = RoleReconciler(self.db)
+        self.scheduler_task = self.bot.loop.create_task(self.birthday_scheduler())
 
     def cog_unload(self):
         """Cleanup when cog is unloaded"""
-        self.birthday_check.cancel()
-        self.role_manager.cancel()
+        self.scheduler_task.cancel()
 
     @commands.command()
     async def setbirthday(self, ctx, date: str):
         """Set your birthday (format: MM-DD)"""
         try:
             # Parse the date string
-            birthday = datetime.strptime(date, "%m-%d")
+            # Parse within a leap year so 02-29 is accepted
+            birthday = datetime.strptime(f"2000-{date}", "%Y-%m-%d")
             
             # Store in database
-            self.db.store_birthday(ctx.author.id, birthday)
+            await self.db.store_birthday(ctx.author.id, birthday)
+            
+            # Associate the birthday with every guild the user shares with the bot
+            # (in the low-memory member cache only the guilds they're cached in, plus this one)
+            guilds = set(ctx.author.mutual_guilds)
+            if ctx.guild:
+                guilds.add(ctx.guild)
+            for guild in guilds:
+                await self.db.add_birthday_member(guild.id, ctx.author.id)
             
             # Send confirmation
             embed = discord.Embed(
@@ -63,7 +77,7 @@ class Birthday(commands.Cog):
         channel = channel or ctx.channel
         
         try:
-            self.db.set_birthday_channel(ctx.guild.id, channel.id)
+            await self.bot.settings.set_birthday_channel(ctx.guild.id, channel.id)
             
             embed = discord.Embed(
                 title="Birthday Channel Set",
@@ -83,7 +97,7 @@ class Birthday(commands.Cog):
         Only server administrators and the server owner can use this command.
         """
         try:
-            self.db.set_birthday_role(ctx.guild.id, role.id)
+            await self.bot.settings.set_birthday_role(ctx.guild.id, role.id)
             
             embed = discord.Embed(
                 title="Birthday Role Set",
@@ -99,13 +113,36 @@ class Birthday(commands.Cog):
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}")
 
+    @commands.command()
+    @is_admin_or_owner()
+    async def set_timezone(self, ctx, timezone_name: str):
+        """Set the timezone used for birthday announcements (e.g. America/New_York)
+        
+        Only server administrators and the server owner can use this command.
+        """
+        if resolve_timezone(timezone_name) is None:
+            return await ctx.send("❌ Unknown timezone. Use an IANA name such as `America/New_York` or `UTC`.")
+            
+        await self.bot.settings.set_timezone(ctx.guild.id, timezone_name)
+        
+        # Wake the scheduler so the new midnight boundary takes effect
+        self.reschedule.set()
+        
+        embed = discord.Embed(
+            title="Timezone Set",
+            description=f"Birthdays will now roll over at midnight {timezone_name} time",
+            color=discord.Color.blue()
+        )
+        await ctx.send(embed=embed)
+
     @commands.command()
     async def upcoming_birthdays(self, ctx, days: int = 365):
         """Show upcoming birthdays within specified days"""
         if not 0 < days <= 365:
             return await ctx.send("❌ Please specify a number of days between 1 and 365.")
 
-        upcoming = self.db.get_upcoming_birthdays(days)
+        today = local_today(await self.get_timezone(ctx.guild.id))
+        upcoming = await self.db.get_upcoming_birthdays(days, ctx.guild.id, today)
         
         if not upcoming:
             return await ctx.send(f"No upcoming birthdays in the next {days} days.")
@@ -116,134 +153,222 @@ class Birthday(commands.Cog):
         )
         
         current_month = None
-        today = datetime.now()
+        members = await fetch_members(ctx.guild, [user_id for user_id, _, _ in upcoming])
         
-        for user_id, birthday in upcoming:
-            user = ctx.guild.get_member(user_id)
+        for user_id, next_birthday, days_until in upcoming:
+            user = members.get(user_id)
             if user:
-                # Calculate the next birthday occurrence
-                next_birthday = birthday.replace(year=today.year)
-                if next_birthday < today:
-                    next_birthday = birthday.replace(year=today.year + 1)
-                
-                # Calculate days until birthday
-                days_until = (next_birthday - today).days
-                date_str = birthday.strftime("%B %d")
+                date_str = next_birthday.strftime("%B %d")
                 
-                # Only show if within the requested range
-                if days_until <= days:
-                    # Group by month
-                    month = next_birthday.strftime("%B")
-                    if month != current_month:
-                        current_month = month
-                        embed.add_field(
-                            name=f"\n{month}",
-                            value="",
-                            inline=False
-                        )
-                    
-                    # Add birthday entry
-                    if days_until == 0:
-                        value = f"**Today!** 🎉"
-                    elif days_until == 1:
-                        value = f"**Tomorrow!** 🎈"
-                    else:
-                        value = f"In {days_until} days"
-                        
+                # Group by month
+                month = next_birthday.strftime("%B")
+                if month != current_month:
+                    current_month = month
                     embed.add_field(
-                        name=user.display_name,
-                        value=f"{date_str} ({value})",
-                        inline=True
+                        name=f"\n{month}",
+                        value="",
+                        inline=False
                     )
+                
+                # Add birthday entry
+                if days_until == 0:
+                    value = f"**Today!** 🎉"
+                elif days_until == 1:
+                    value = f"**Tomorrow!** 🎈"
+                else:
+                    value = f"In {days_until} days"
+                    
+                embed.add_field(
+                    name=user.display_name,
+                    value=f"{date_str} ({value})",
+                    inline=True
+                )
 
         if len(embed.fields) == 0:
             return await ctx.send(f"No upcoming birthdays in the next {days} days.")
             
         await ctx.send(embed=embed)
 
-    @tasks.loop(hours=24)
-    async def birthday_check(self):
-        """Check for birthdays and send notifications"""
-        today = datetime.now().strftime("%m-%d")
-        birthday_users = self.db.get_todays_birthdays()
+    async def get_timezone(self, guild_id: int) -> Optional[tzinfo]:
+        """Get the configured timezone for a guild (None means the host's local time)"""
+        return resolve_timezone(await self.bot.settings.get_timezone(guild_id))
 
-        for guild in self.bot.guilds:
-            channel_id = self.db.get_birthday_channel(guild.id)
-            if not channel_id:
-                continue
-                
-            channel = guild.get_channel(channel_id)
-            if not channel:
-                continue
-
-            for user_id in birthday_users:
-                member = guild.get_member(user_id)
-                if member:
-                    embed = discord.Embed(
-                        title="🎉 Happy Birthday!",
-                        description=f"Everyone wish {member.mention} a happy birthday!",
-                        color=discord.Color.gold()
-                    )
-                    embed.set_thumbnail(url=member.display_avatar.url)
-                    
-                    # Add a random birthday message
-                    messages = [
-                        "Hope your day is filled with joy and cake! 🎂",
-                        "Another year of awesome! Have a great day! 🎈",
-                        "Time to celebrate! Happy Birthday! 🎊",
-                        "Wishing you the happiest of birthdays! 🎁",
-                        "Have an amazing birthday celebration! 🎉"
-                    ]
-                    import random
-                    embed.add_field(
-                        name="Message",
-                        value=random.choice(messages)
-                    )
-                    
-                    await channel.send(embed=embed)
-
-    @tasks.loop(hours=1)
-    async def role_manager(self):
-        """Manage birthday roles"""
-        now = datetime.now()
-        today = now.strftime("%m-%d")
-        yesterday = (now - timedelta(days=1)).strftime("%m-%d")
-
-        for guild in self.bot.guilds:
-            role_id = self.db.get_birthday_role(guild.id)
-            if not role_id:
-                continue
-                
-            role = guild.get_role(role_id)
-            if not role:
-                continue
-
-            # Remove role from yesterday's birthday users
-            yesterday_birthdays = self.db.get_birthdays_for_date(yesterday)
-            for user_id in yesterday_birthdays:
-                member = guild.get_member(user_id)
-                if member and role in member.roles:
-                    try:
-                        await member.remove_roles(role)
-                    except discord.HTTPException:
-                        continue
-
-            # Add role to today's birthday users
-            today_birthdays = self.db.get_birthdays_for_date(today)
-            for user_id in today_birthdays:
-                member = guild.get_member(user_id)
-                if member and role not in member.roles:
-                    try:
-                        await member.add_roles(role)
-                    except discord.HTTPException:
-                        continue
-
-    @birthday_check.before_loop
-    @role_manager.before_loop
-    async def before_loops(self):
-        """Wait until the bot is ready before starting loops"""
+    async def birthday_scheduler(self):
+        """Run the birthday job at each guild's local midnight"""
         await self.bot.wait_until_ready()
 
+        # Backfill guild associations for birthdays stored before they were tracked, or for
+        # members who joined while the bot was offline (only where the member list is cached)
+        user_ids = await self.db.get_birthday_users()
+        for guild in self.bot.owned_guilds():
+            if guild.chunked:
+                await self.db.add_birthday_members(guild.id, self.birthday_members(guild, user_ids))
+
+        # Clean up stale birthday roles left over while the bot was offline
+        for guild in self.bot.owned_guilds():
+            if await self.bot.settings.get_birthday_role(guild.id):
+                try:
+                    await self.role_manager(guild, local_today(await self.get_timezone(guild.id)))
+                except Exception as e:
+                    print(f"Error reconciling birthday role in guild {guild.name}: {e}")
+
+        self.last_runs = {guild_id: last_run for guild_id, last_run in (await self.db.get_birthday_runs()).items()
+                          if self.bot.owns_guild(guild_id)}
+
+        while not self.bot.is_closed():
+            self.reschedule.clear()
+            try:
+                await self.run_due_guilds()
+            except Exception as e:
+                print(f"Error running birthday job: {e}")
+
+            # Sleep until the next midnight boundary of any guild's timezone
+            now = datetime.now(timezone.utc)
+            boundaries = set()
+            for guild in self.bot.owned_guilds():
+                boundaries.add(next_midnight(await self.get_timezone(guild.id)))
+            delay = (min(boundaries, default=next_midnight()) - now).total_seconds()
+            try:
+                await asyncio.wait_for(self.reschedule.wait(), timeout=max(delay, 0) + 1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_due_guilds(self):
+        """Process every guild whose local date changed since its last run"""
+        due: Dict[date, list] = {}
+        for guild in self.bot.owned_guilds():
+            today = local_today(await self.get_timezone(guild.id))
+            # ISO dates compare as strings; moving to a zone further west must not replay a day
+            last_run = self.last_runs.get(guild.id)
+            if last_run is None or last_run < today.isoformat():
+                due.setdefault(today, []).append(guild)
+
+        for today, guilds in due.items():
+            # Only guilds with a birthday today, or a birthday role still handed out, need any work
+            active = await self.db.get_birthday_guilds([today])
+            holders = await self.db.get_role_holder_guilds()
+            runs = {}
+            for guild in guilds:
+                try:
+                    if guild.id in active:
+                        await self.birthday_check(guild, today)
+                    if guild.id in active or guild.id in holders:
+                        await self.role_manager(guild, today)
+                except Exception as e:
+                    print(f"Error processing birthdays in guild {guild.name}: {e}")
+                runs[guild.id] = today.isoformat()
+
+            await self.db.set_birthday_runs(runs)
+            self.last_runs.update(runs)
+
+    async def birthday_check(self, guild: discord.Guild, today: date):
+        """Send birthday notifications for a guild"""
+        channel_id = await self.bot.settings.get_birthday_channel(guild.id)
+        if not channel_id:
+            return
+            
+        channel = guild.get_channel(channel_id)
+        if not channel:
+            return
+
+        user_ids = await self.db.get_birthdays_for_date(today, guild.id)
+        found = await fetch_members(guild, user_ids)
+        members = [found[user_id] for user_id in user_ids if user_id in found]
+        if not members:
+            return
+
+        if not BIRTHDAY_SETTINGS['batch_announcements']:
+            for member in members:
+                self.bot.dispatcher.enqueue(channel, embed=self.create_birthday_embed([member]))
+            return
+
+        # One message for the whole guild, split into pages only past the embed field limit
+        per_page = BIRTHDAY_SETTINGS['members_per_embed']
+        pages = [members[i:i + per_page] for i in range(0, len(members), per_page)]
+        for page_number, page in enumerate(pages, 1):
+            embed = self.create_birthday_embed(page)
+            if len(pages) > 1:
+                embed.set_footer(text=f"Page {page_number}/{len(pages)}")
+            self.bot.dispatcher.enqueue(channel, embed=embed)
+
+    def create_birthday_embed(self, members: List[discord.Member]) -> discord.Embed:
+        """Create a birthday announcement embed for one or more members"""
+        if len(members) == 1:
+            member = members[0]
+            embed = discord.Embed(
+                title="🎉 Happy Birthday!",
+                description=f"Everyone wish {member.mention} a happy birthday!",
+                color=discord.Color.gold()
+            )
+            embed.set_thumbnail(url=member.display_avatar.url)
+            
+            # Add a random birthday message
+            embed.add_field(
+                name="Message",
+                value=random.choice(BIRTHDAY_MESSAGES)
+            )
+            return embed
+
+        mentions = ", ".join(member.mention for member in members[:-1])
+        embed = discord.Embed(
+            title="🎉 Happy Birthday!",
+            description=f"Everyone wish {mentions} and {members[-1].mention} a happy birthday!",
+            color=discord.Color.gold()
+        )
+        
+        # Keep a random birthday message for each member
+        for member in members:
+            embed.add_field(
+                name=member.display_name,
+                value=random.choice(BIRTHDAY_MESSAGES),
+                inline=False
+            )
+        return embed
+
+    async def role_manager(self, guild: discord.Guild, today: date):
+        """Give the birthday role to exactly today's birthday members"""
+        role_id = await self.bot.settings.get_birthday_role(guild.id)
+        if not role_id:
+            return
+            
+        role = guild.get_role(role_id)
+        if not role:
+            return
+
+        desired = set(await self.db.get_birthdays_for_date(today, guild.id))
+        await self.reconciler.reconcile(guild, role, desired, today.isoformat())
+
+    @staticmethod
+    def birthday_members(guild: discord.Guild, user_ids: set) -> list:
+        """IDs of the cached members of a guild that have a stored birthday"""
+        # Walk whichever side is smaller: the guild's members or the stored birthdays
+        if len(user_ids) < (guild.member_count or 0):
+            return [user_id for user_id in user_ids if guild.get_member(user_id)]
+        return [member.id for member in guild.members if member.id in user_ids]
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        """Track birthdays for members joining a guild"""
+        await self.db.add_birthday_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        """Stop tracking birthdays for members leaving a guild"""
+        await self.db.remove_birthday_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        """Track birthdays for the members of a newly joined guild"""
+        if guild.chunked:
+            user_ids = await self.db.get_birthday_users()
+            await self.db.add_birthday_members(guild.id, self.birthday_members(guild, user_ids))
+        self.reschedule.set()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        """Drop birthday associations for a guild the bot left"""
+        await self.db.clear_birthday_members(guild.id)
+
 async def setup(bot):
     """Setup function for loading the cog"""
     await bot.add_cog(Birthday(bot))
\ No newline at end of file
@@ -18,6 +18,7 @@ class General(commands.Cog):
     async def on_ready(self):
         """Called when the bot is ready"""
         print(f'Logged in as {self.bot.user.name} (ID: {self.bot.user.id})')
+        print(f'Shards: {self.bot.shard_ids or "all"} of {self.bot.shard_count}, {len(self.bot.guilds)} guilds')
         print('------')
         
         # Set custom status
@@ -154,7 +155,7 @@ class General(commands.Cog):
         # General information
         embed.add_field(
             name="Owner",
-            value=guild.owner.mention,
+            value=f"<@{guild.owner_id}>",  # the owner may not be cached
             inline=True
         )
         embed.add_field(
@@ -168,16 +169,25 @@ class General(commands.Cog):
             inline=True
         )
         
-        # Member counts
-        total_members = len(guild.members)
-        bot_count = len([m for m in guild.members if m.bot])
-        human_count = total_members - bot_count
+        # Member counts (the full breakdown needs every member cached)
+        if guild.chunked:
+            total_members = len(guild.members)
+            bot_count = len([m for m in guild.members if m.bot])
+            human_count = total_members - bot_count
+            members = (f"👥 Total: {total_members}\n"
+                       f"👤 Humans: {human_count}\n"
+                       f"🤖 Bots: {bot_count}")
+        else:
+            try:
+                counts = await self.bot.fetch_guild(guild.id, with_counts=True)
+                members = (f"👥 Total: ~{counts.approximate_member_count}\n"
+                           f"🟢 Online: ~{counts.approximate_presence_count}")
+            except discord.HTTPException:
+                members = f"👥 Total: {guild.member_count}"
         
         embed.add_field(
             name="Members",
-            value=f"👥 Total: {total_members}\n"
-                  f"👤 Humans: {human_count}\n"
-                  f"🤖 Bots: {bot_count}",
+            value=members,
             inline=True
         )
         
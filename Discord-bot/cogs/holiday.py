@@ -1,23 +1,24 @@
 # cogs/holiday.py
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from datetime import datetime, date, timedelta
 from typing import Optional, Tuple, Dict
-from config.constants import HOLIDAYS
-from utils.database import Database
+from utils.holiday_calendar import HolidayCalendar
+from utils.scheduler import start_of_day
 
 class Holiday(commands.Cog):
     """Holiday commands and automatic notifications"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        self.check_holidays.start()
+        self.db = bot.db
+        self.calendar = HolidayCalendar()
         self.last_triggered = {}
+        self.holiday_task = self.bot.loop.create_task(self.holiday_scheduler())
 
     def cog_unload(self):
         """Cleanup when cog is unloaded"""
-        self.check_holidays.cancel()
+        self.holiday_task.cancel()
 
     @commands.command()
     @commands.has_permissions(manage_channels=True)
@@ -26,7 +27,7 @@ class Holiday(commands.Cog):
         channel = channel or ctx.channel
         
         try:
-            self.db.set_holiday_channel(ctx.guild.id, channel.id)
+            await self.bot.settings.set_holiday_channel(ctx.guild.id, channel.id)
             
             embed = discord.Embed(
                 title="Holiday Channel Set",
@@ -38,31 +39,13 @@ class Holiday(commands.Cog):
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}")
 
-    def get_holiday_channel(self, guild_id: int) -> Optional[int]:
+    async def get_holiday_channel(self, guild_id: int) -> Optional[int]:
         """Get the configured holiday announcement channel for a guild"""
-        return self.db.get_holiday_channel(guild_id)
+        return await self.bot.settings.get_holiday_channel(guild_id)
 
     def get_next_holiday(self) -> Tuple[str, date]:
         """Get the next upcoming holiday"""
-        today = date.today()
-        next_holiday = None
-        days_until = 366  # Max days to look ahead
-
-        for holiday, date_tuple in HOLIDAYS.items():
-            # Create a date object for this year
-            holiday_date = date(today.year, date_tuple[0], date_tuple[1])
-            
-            # If the holiday has already passed this year, use next year's date
-            if holiday_date < today:
-                holiday_date = date(today.year + 1, date_tuple[0], date_tuple[1])
-            
-            delta = (holiday_date - today).days
-            
-            if delta < days_until:
-                next_holiday = (holiday, holiday_date)
-                days_until = delta
-
-        return next_holiday
+        return self.calendar.next_holiday(date.today())
 
     @commands.command(name='next_holiday')
     async def next_holiday(self, ctx):
@@ -113,47 +96,56 @@ class Holiday(commands.Cog):
 
         await ctx.send(embed=embed)
 
-    @tasks.loop(hours=5)
+    async def holiday_scheduler(self):
+        """Announce holidays, sleeping until the next occurrence in between"""
+        await self.bot.wait_until_ready()
+
+        while not self.bot.is_closed():
+            await self.check_holidays()
+
+            # Sleep until midnight at the start of the next holiday
+            _, holiday_date = self.calendar.next_holiday_after(date.today())
+            await discord.utils.sleep_until(start_of_day(holiday_date))
+
     async def check_holidays(self):
         """Check for holidays and send notifications"""
         today = date.today()
         
-        for holiday, holiday_date in HOLIDAYS.items():
-            if today.month == holiday_date[0] and today.day == holiday_date[1]:
-                if holiday not in self.last_triggered or self.last_triggered[holiday] != today:
-                    for guild in self.bot.guilds:
-                        try:
-                            # Try to get the configured holiday channel
-                            channel_id = self.get_holiday_channel(guild.id)
-                            if channel_id:
-                                channel = guild.get_channel(channel_id)
-                            else:
-                                # Try to find the general channel
-                                channel = discord.utils.get(guild.text_channels, name='general')
-                                
-                            # If still no channel found, use system channel as last resort
-                            if not channel:
-                                channel = guild.system_channel
+        for holiday in self.calendar.holidays_on(today):
+            if holiday not in self.last_triggered or self.last_triggered[holiday] != today:
+                for guild in self.bot.owned_guilds():
+                    try:
+                        # Try to get the configured holiday channel
+                        channel_id = await self.get_holiday_channel(guild.id)
+                        if channel_id:
+                            channel = guild.get_channel(channel_id)
+                        else:
+                            # Try to find the general channel
+                            channel = discord.utils.get(guild.text_channels, name='general')
+                            
+                        # If still no channel found, use system channel as last resort
+                        if not channel:
+                            channel = guild.system_channel
+                        
+                        if channel and channel.permissions_for(guild.me).send_messages:
+                            embed = discord.Embed(
+                                title=f"Happy {holiday}! 🎉",
+                                description=self._get_holiday_message(holiday),
+                                color=self._get_holiday_color(holiday)
+                            )
+                            self._customize_holiday_embed(embed, holiday)
+                            self.bot.dispatcher.enqueue(channel, embed=embed)
                             
-                            if channel and channel.permissions_for(guild.me).send_messages:
-                                embed = discord.Embed(
-                                    title=f"Happy {holiday}! 🎉",
-                                    description=self._get_holiday_message(holiday),
-                                    color=self._get_holiday_color(holiday)
-                                )
-                                self._customize_holiday_embed(embed, holiday)
-                                await channel.send(embed=embed)
-                                
-                        except Exception as e:
-                            print(f"Error sending holiday message in guild {guild.name}: {e}")
-                            continue
-
-                    self.last_triggered[holiday] = today
+                    except Exception as e:
+                        print(f"Error sending holiday message in guild {guild.name}: {e}")
+                        continue
+
+                self.last_triggered[holiday] = today
 
     @commands.command()
     async def holiday_channel(self, ctx):
         """Show the current holiday announcement channel"""
-        channel_id = self.get_holiday_channel(ctx.guild.id)
+        channel_id = await self.get_holiday_channel(ctx.guild.id)
         if channel_id:
             channel = ctx.guild.get_channel(channel_id)
             if channel:
@@ -239,11 +231,6 @@ class Holiday(commands.Cog):
                 value=customizations[holiday]["value"]
             )
 
-    @check_holidays.before_loop
-    async def before_check_holidays(self):
-        """Wait until the bot is ready before starting the holiday check loop"""
-        await self.bot.wait_until_ready()
-
 async def setup(bot):
     """Setup function for loading the cog"""
     await bot.add_cog(Holiday(bot))
\ No newline at end of file
@@ -1,8 +1,11 @@
 # cogs/music.py
 import discord
 from discord.ext import commands, tasks
-from utils.music_util import YTDLSource, MusicPlayer, QueueManager
+from utils.music_util import MusicPlayer, QueueManager, Track
+from utils.extraction import extract_info, extract_playlist_page, is_playlist_url
 from utils.views import MusicControlView
+from utils.visualizer import VisualizerScheduler
+from config.constants import MUSIC_SETTINGS, VISUALIZER
 import asyncio
 from typing import Optional
 from collections import deque
@@ -12,21 +15,27 @@ class Music(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.music_players = {}
-        self.visualizer_messages = {}
+        self.visualizer = VisualizerScheduler(bot)
         self.visualizer_loop.start()
 
     def cog_unload(self):
         """Cleanup when cog is unloaded"""
         self.visualizer_loop.cancel()
+        self.visualizer.close()
 
     async def get_player(self, ctx) -> MusicPlayer:
         """Get or create a MusicPlayer instance for a guild"""
-        if ctx.guild.id not in self.music_players:
-            player = MusicPlayer(self.bot)
-            self.music_players[ctx.guild.id] = player
-            return player
-        return self.music_players[ctx.guild.id]
+        player = self.bot.music_players.get(ctx.guild.id)
+        if player is None:
+            depth = await self.bot.settings.get_prefetch_depth(ctx.guild.id)
+            # Another command may have registered a player while the setting loaded
+            player = self.bot.music_players.get(ctx.guild.id)
+            if player is None:
+                player = MusicPlayer(self.bot, ctx.guild, ctx.channel)
+                if depth is not None:
+                    player.prefetch_depth = depth
+                self.bot.music_players[ctx.guild.id] = player
+        return player
 
     @commands.command()
     async def join(self, ctx):
@@ -48,11 +57,11 @@ class Music(commands.Cog):
         if ctx.voice_client is None:
             return await ctx.send("I'm not connected to a voice channel.")
         
-        await ctx.voice_client.disconnect()
-        
-        # Cleanup
-        if ctx.guild.id in self.music_players:
-            self.music_players[ctx.guild.id].destroy(ctx.guild)
+        player = self.bot.music_players.get(ctx.guild.id)
+        if player:
+            player.destroy()
+        else:
+            await ctx.voice_client.disconnect()
             
         await ctx.send("Left the voice channel")
 
@@ -69,15 +78,24 @@ class Music(commands.Cog):
         async with ctx.typing():
             try:
                 player = await self.get_player(ctx)
-                source = await YTDLSource.from_url(query, loop=self.bot.loop, stream=True)
+                if len(player.queue) >= MUSIC_SETTINGS['max_queue_size']:
+                    return await ctx.send("The queue is full.")
+                    
+                if is_playlist_url(query):
+                    return await self._play_playlist(ctx, player, query)
+                    
+                data = await extract_info(query, guild_id=ctx.guild.id)
+                track = Track.from_data(data, query=query, requester=ctx.author)
                 
-                await player.queue.put(source)
+                idle = player.current_track is None and not player.queue
+                player.queue.put(track)
                 
-                if not ctx.voice_client.is_playing():
-                    await self._play_next(ctx, player)
-                    await ctx.send(f"Now playing: {source.title}")
+                if idle:
+                    await ctx.send(f"Now playing: {track.title}")
                 else:
-                    await ctx.send(f"Added to queue: {source.title}")
+                    await ctx.send(f"Added to queue: {track.title}")
+                    # Warm the new entry if it landed within the prefetch window
+                    player.schedule_prefetch()
                     
             except Exception as e:
                 await ctx.send(f"An error occurred: {str(e)}")
@@ -93,15 +111,41 @@ class Music(commands.Cog):
 
     @commands.command()
     async def resume(self, ctx):
-        """Resume the current song"""
+        """Resume the current song, or the song interrupted by the last disconnect"""
         if ctx.voice_client is None:
-            return await ctx.send("I'm not connected to a voice channel.")
+            if ctx.author.voice is None:
+                return await ctx.send("I'm not connected to a voice channel.")
+            await ctx.author.voice.channel.connect()
             
         if ctx.voice_client.is_paused():
             ctx.voice_client.resume()
-            await ctx.send("Resumed ▶️")
-        else:
-            await ctx.send("The music is not paused.")
+            return await ctx.send("Resumed ▶️")
+        if ctx.voice_client.is_playing():
+            return await ctx.send("The music is not paused.")
+
+        player = await self.get_player(ctx)
+        track = await player.restore_position()
+        if track is None:
+            return await ctx.send("There is nothing to resume.")
+        await ctx.send(f"Resuming {track.title} from {MusicPlayer.format_duration(track.start)} ▶️")
+
+    @commands.command()
+    async def seek(self, ctx, position: str):
+        """Jump to a position in the current song (H:MM:SS, M:SS or seconds)"""
+        player = await self.get_player(ctx)
+        if player.current is None:
+            return await ctx.send("Nothing is playing right now.")
+
+        seconds = MusicPlayer.parse_duration(position)
+        if seconds is None:
+            return await ctx.send("❌ Invalid position. Use H:MM:SS, M:SS or seconds (e.g. `1:02:03`, `2:30` or `150`).")
+        try:
+            moved = await player.seek(seconds)
+        except Exception as e:
+            return await ctx.send(f"Could not seek: {e}")
+        if not moved:
+            return await ctx.send("The song ended before it could be moved.")
+        await ctx.send(f"Jumped to {MusicPlayer.format_duration(player.current.position)} ⏩")
 
     @commands.command()
     async def stop(self, ctx):
@@ -110,8 +154,7 @@ class Music(commands.Cog):
             return await ctx.send("I'm not connected to a voice channel.")
 
         player = await self.get_player(ctx)
-        player.queue._queue.clear()
-        ctx.voice_client.stop()
+        player.stop()
         await ctx.send("Stopped playing and cleared the queue ⏹️")
 
     @commands.command()
@@ -123,11 +166,12 @@ class Music(commands.Cog):
         if not ctx.voice_client.is_playing():
             return await ctx.send("Nothing is playing right now.")
 
-        ctx.voice_client.stop()
+        player = await self.get_player(ctx)
+        player.skip()
         await ctx.send("Skipped ⏭️")
 
     @commands.command()
-    async def queue(self, ctx):
+    async def queue(self, ctx, page: int = 1):
         """Display the current queue"""
         player = await self.get_player(ctx)
         
@@ -135,6 +179,7 @@ class Music(commands.Cog):
             return await ctx.send("Nothing is playing right now.")
 
         # Create queue embed
+        entries, pages = player.queue.page(page, MUSIC_SETTINGS['queue_page_size'])
         embed = discord.Embed(title="Music Queue", color=discord.Color.blue())
         
         # Add current song
@@ -145,10 +190,10 @@ class Music(commands.Cog):
         )
         
         # Add upcoming songs
-        upcoming = list(player.queue._queue)
-        if upcoming:
-            queue_text = "\n".join(f"{i+1}. {song.title}" for i, song in enumerate(upcoming))
+        if entries:
+            queue_text = "\n".join(f"{i}. {song.title}" for i, song in entries)
             embed.add_field(name="Up Next", value=queue_text, inline=False)
+            embed.set_footer(text=f"Page {min(max(page, 1), pages)}/{pages} • {len(player.queue)} song(s) queued")
         else:
             embed.add_field(name="Up Next", value="No songs in queue", inline=False)
 
@@ -159,21 +204,54 @@ class Music(commands.Cog):
         """Shuffle the queue"""
         player = await self.get_player(ctx)
         
-        if player.queue.qsize() < 2:
+        if len(player.queue) < 2:
             return await ctx.send("Need at least 2 songs in the queue to shuffle.")
 
-        # Get all items from queue
-        items = list(player.queue._queue)
-        player.queue._queue.clear()
+        player.queue.shuffle()
         
-        # Shuffle and put back
-        import random
-        random.shuffle(items)
-        for item in items:
-            await player.queue.put(item)
+        # The head of the queue changed, so re-warm it
+        player.schedule_prefetch()
             
         await ctx.send("Queue has been shuffled! 🔀")
 
+    @commands.command()
+    async def remove(self, ctx, position: int):
+        """Remove a song from the queue by its position"""
+        player = await self.get_player(ctx)
+        
+        if not 1 <= position <= len(player.queue):
+            return await ctx.send(f"Position must be between 1 and {len(player.queue)}.")
+
+        track = player.queue.remove(position - 1)
+        player.schedule_prefetch()
+        await ctx.send(f"Removed from queue: {track.title}")
+
+    @commands.command()
+    async def move(self, ctx, source: int, destination: int):
+        """Move a song to another position in the queue"""
+        player = await self.get_player(ctx)
+        
+        size = len(player.queue)
+        if not (1 <= source <= size and 1 <= destination <= size):
+            return await ctx.send(f"Positions must be between 1 and {size}.")
+
+        track = player.queue.move(source - 1, destination - 1)
+        player.schedule_prefetch()
+        await ctx.send(f"Moved {track.title} to position {destination}")
+
+    @commands.command()
+    async def previous(self, ctx):
+        """Play the previous song again"""
+        if ctx.voice_client is None:
+            return await ctx.send("I'm not connected to a voice channel.")
+
+        player = await self.get_player(ctx)
+        track = player.previous()
+        if track is None:
+            return await ctx.send("There is no previous song.")
+
+        await ctx.send(f"Going back to: {track.title} ⏮️")
+
     @commands.command()
     async def loop(self, ctx, mode: str = 'off'):
         """Set loop mode (off/single/queue)"""
@@ -196,67 +274,136 @@ class Music(commands.Cog):
             return await ctx.send("Volume must be between 0 and 100.")
 
         player = await self.get_player(ctx)
-        player.volume = volume / 100
-        if ctx.voice_client.source:
-            ctx.voice_client.source.volume = volume / 100
+        await player.set_volume(volume / 100)
 
         await ctx.send(f"Volume set to {volume}%")
 
+    @commands.command()
+    async def fx(self, ctx, effect: str = None, value: str = None):
+        """Show or change audio effects (normalize, bass, nightcore, reset)"""
+        player = await self.get_player(ctx)
+        if effect is None:
+            return await ctx.send(f"Active effects: {player.effects.describe()}")
+
+        try:
+            await player.set_effect(effect.lower(), value)
+        except ValueError as e:
+            return await ctx.send(str(e))
+
+        await ctx.send(f"Active effects: {player.effects.describe()} 🎛️")
+
+    @commands.command()
+    async def prefetch(self, ctx, depth: int = None):
+        """Show or set how many upcoming songs are preloaded"""
+        player = await self.get_player(ctx)
+        if depth is None:
+            return await ctx.send(f"Prefetching the next {player.prefetch_depth} song(s).")
+
+        max_depth = MUSIC_SETTINGS['max_prefetch_depth']
+        if not 0 <= depth <= max_depth:
+            return await ctx.send(f"Prefetch depth must be between 0 and {max_depth}.")
+
+        player.prefetch_depth = depth
+        await self.bot.settings.set_prefetch_depth(ctx.guild.id, depth)
+        await ctx.send(f"Now prefetching the next {depth} song(s).")
+
     @commands.command()
     async def controls(self, ctx):
         """Display the music control panel"""
         view = MusicControlView(ctx)
-        embed = discord.Embed(title="🎵 Music Controls", color=discord.Color.purple())
-        
         player = await self.get_player(ctx)
-        current_song = "No song playing"
-        if player.current:
-            current_song = player.current.title
-            
-        embed.add_field(name="Current Song", value=current_song)
-        await ctx.send(embed=embed, view=view)
+        embed = await player.create_embed()
+        message = await ctx.send(embed=embed, view=view)
+        
+        # The panel's embed becomes this guild's live now-playing display
+        self.bot.visualizer_messages[ctx.guild.id] = message
 
-    async def _play_next(self, ctx, player):
-        """Helper method to play the next song"""
-        if player.queue.empty():
-            return
+    async def _play_playlist(self, ctx, player, url: str):
+        """Queue a playlist, starting playback as soon as its first page resolves"""
+        first_page = MUSIC_SETTINGS['playlist_first_page']
+        data = await extract_playlist_page(url, 1, first_page, guild_id=ctx.guild.id)
+        idle = player.current_track is None and not player.queue
+        added = await self._enqueue_entries(ctx, player, data['entries'])
+        if not added:
+            return await ctx.send("That playlist has no playable entries.")
             
-        # Get next song from queue
-        source = await player.queue.get()
-        ctx.voice_client.play(
-            source, 
-            after=lambda e: self.bot.loop.create_task(self._play_next(ctx, player))
+        title = data.get('title') or "playlist"
+        if not idle:
+            player.schedule_prefetch()
+        if len(data['entries']) < first_page:
+            return await ctx.send(f"Queued {added} song(s) from **{title}**.")
+
+        # Stream the remaining pages into the queue without blocking the command,
+        # after any playlist that is still loading
+        previous = player.ingest_task
+        if previous and not previous.done():
+            await ctx.send(f"Queued {added} song(s) from **{title}**, "
+                           f"loading the rest once the playlist already loading is done...")
+        else:
+            previous = None
+            await ctx.send(f"Queued {added} song(s) from **{title}**, loading the rest in the background...")
+        player.ingest_task = self.bot.loop.create_task(
+            self._ingest_playlist(ctx, player, url, title, first_page + 1, added, previous)
         )
-        player.current = source
+        if previous is not None:
+            # Stopping the player cancels the latest ingestion; take the earlier ones down with it
+            player.ingest_task.add_done_callback(lambda task: task.cancelled() and previous.cancel())
+
+    async def _ingest_playlist(self, ctx, player, url: str, title: str, start: int, added: int,
+                               previous: Optional[asyncio.Task] = None):
+        """Background task adding a playlist's remaining pages to the queue
+
+        Waits for ``previous`` (an earlier playlist's ingestion) first, so
+        playlists are loaded one after another in the order they were queued.
+        """
+        page_size = MUSIC_SETTINGS['playlist_page_size']
+        try:
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            while len(player.queue) < MUSIC_SETTINGS['max_queue_size']:
+                data = await extract_playlist_page(url, start, start + page_size - 1, guild_id=ctx.guild.id)
+                added += await self._enqueue_entries(ctx, player, data['entries'])
+                if len(data['entries']) < page_size:
+                    break
+                start += page_size
+                
+            if len(player.queue) >= MUSIC_SETTINGS['max_queue_size']:
+                await ctx.send(f"Queue is full; stopped loading **{title}** after {added} song(s).")
+            else:
+                await ctx.send(f"Finished loading **{title}**: {added} song(s) queued.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await ctx.send(f"Stopped loading **{title}** after {added} song(s): {e}")
+        finally:
+            if player.ingest_task is asyncio.current_task():
+                player.ingest_task = None
+
+    async def _enqueue_entries(self, ctx, player, entries: list) -> int:
+        """Add flat playlist entries to the queue up to its size limit"""
+        added = 0
+        for entry in entries:
+            if len(player.queue) >= MUSIC_SETTINGS['max_queue_size']:
+                break
+            if not (entry.get('webpage_url') or entry.get('url')):
+                continue
+            player.queue.put(Track.from_flat(entry, requester=ctx.author))
+            added += 1
+        return added
 
-    @tasks.loop(seconds=1)
+    @tasks.loop(seconds=VISUALIZER['tick'])
     async def visualizer_loop(self):
         """Update the music visualizer for all active players"""
-        for guild_id, player in self.music_players.items():
-            if guild_id in self.visualizer_messages and player.current:
-                message = self.visualizer_messages[guild_id]
-                try:
-                    embed = await player.create_embed()
-                    await message.edit(embed=embed)
-                except discord.errors.NotFound:
-                    # Message was deleted
-                    del self.visualizer_messages[guild_id]
-                except Exception as e:
-                    print(f"Error updating visualizer: {e}")
+        self.visualizer.tick()
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         """Handle bot disconnection and cleanup"""
         if member == self.bot.user and after.channel is None:
-            guild_id = before.channel.guild.id
-            if guild_id in self.music_players:
-                self.music_players[guild_id].destroy(before.channel.guild)
-                if guild_id in self.visualizer_messages:
-                    try:
-                        await self.visualizer_messages[guild_id].delete()
-                    except:
-                        pass
-                    del self.visualizer_messages[guild_id]
+            player = self.bot.music_players.get(before.channel.guild.id)
+            if player:
+                # Also removes the player's visualizer message
+                player.destroy()
 
 async def setup(bot):
     """Setup function for loading the cog"""
@@ -1,19 +1,21 @@
 # config/constants.py
+import calendar
 from datetime import datetime
 from discord import Color
 
-# Holiday definitions
+# Holiday definitions: (month, day) for fixed dates,
+# (month, weekday, n) for the nth weekday of a month, or 'easter'
 HOLIDAYS = {
     "New Year's Day": (1, 1),
     "Valentine's Day": (2, 14),
     "St. Patrick's Day": (3, 17),
     "April Fools' Day": (4, 1),
-    "Easter": (4, 9),  # Note: Date changes yearly
-    "Mother's Day": (5, 14),  # Second Sunday in May
-    "Father's Day": (6, 18),  # Third Sunday in June
+    "Easter": 'easter',  # Computed yearly (Gregorian computus)
+    "Mother's Day": (5, calendar.SUNDAY, 2),  # Second Sunday in May
+    "Father's Day": (6, calendar.SUNDAY, 3),  # Third Sunday in June
     "Independence Day": (7, 4),
     "Halloween": (10, 31),
-    "Thanksgiving": (11, 23),  # Fourth Thursday in November
+    "Thanksgiving": (11, calendar.THURSDAY, 4),  # Fourth Thursday in November
     "Christmas Eve": (12, 24),
     "Christmas": (12, 25),
     "New Year's Eve": (12, 31)
@@ -33,10 +35,87 @@ COLORS = {
 # Music Settings
 MUSIC_SETTINGS = {
     'default_volume': 0.5,
+    'opus_passthrough': True,  # copy Opus packets instead of decoding when volume and effects allow
     'max_queue_size': 500,
     'timeout_duration': 300,  # 5 minutes of inactivity before bot leaves
     'allowed_file_types': ['.mp3', '.wav', '.m4a', '.flac'],
     'max_song_duration': 10800,  # 3 hours in seconds
+    'prefetch_depth': 1,  # upcoming tracks warmed while the current one plays
+    'max_prefetch_depth': 2,
+    'prefetch_max_age': 600,  # respawn a queued FFmpeg process idle longer than this (seconds)
+    'playlist_first_page': 5,  # playlist entries fetched before playback starts
+    'playlist_page_size': 50,  # entries per background playlist page
+    'history_size': 50,  # finished tracks remembered for !previous
+    'queue_page_size': 10,  # tracks per !queue page
+}
+
+# Audio Effects Settings
+EFFECTS_SETTINGS = {
+    'bass_levels': [0.0, 1.0, 2.0, 3.5],  # low band gain added per !fx bass level
+    'bass_window': 48,  # moving-average length in samples (~440Hz cutoff at 48kHz)
+    'normalize_target': 5000.0,  # target RMS in int16 units (about -16 dBFS)
+    'normalize_gate': 300.0,  # frames quieter than this keep the current gain
+    'normalize_min_gain': 0.25,
+    'normalize_max_gain': 4.0,
+    'normalize_speed': 0.05,  # fraction of the gain error corrected per frame
+    'nightcore_rate': 1.25,  # speed and pitch factor
+}
+
+# On-disk Audio Cache Settings
+AUDIO_CACHE = {
+    'enabled': True,
+    'directory': 'audio_cache',
+    'max_bytes': 1024 * 1024 * 1024,  # 1 GiB, least recently used files are evicted past this
+    'play_threshold': 3,  # plays before a track is written to disk
+    'tracked_plays': 5000,  # tracks whose play counts are remembered
+    'max_duration': 1200,  # don't cache tracks longer than 20 minutes
+    'bitrate': '128k',  # used when the source isn't Opus already
+    'fill_timeout': 300,
+}
+
+# Voice Worker Settings
+VOICE_WORKERS = {
+    'processes': 0,  # processes doing FFmpeg reads, effects and Opus encoding; 0 keeps it all in the bot process
+    'buffer_frames': 50,  # packets a worker may run ahead of playback (1 second)
+    'ack_every': 10,  # packets played between flow control messages to the worker
+    'read_timeout': 5,  # seconds the voice thread waits for a packet before ending the track
+    'shutdown_timeout': 5,
+}
+
+# Track Extraction Settings
+EXTRACTION_SETTINGS = {
+    'cache_size': 512,  # tracks kept in the metadata/stream URL cache
+    'cache_ttl': 6 * 3600,  # seconds before cached metadata is refreshed
+    'stream_url_margin': 600,  # drop entries this long before their stream URL expires
+    'workers': 4,  # concurrent yt-dlp extractions
+    'mode': 'thread',  # 'thread' or 'process' (process keeps yt-dlp off the voice threads' GIL)
+    'timeout': 30,  # seconds before a single extraction is abandoned
+}
+
+# Birthday Settings
+BIRTHDAY_SETTINGS = {
+    'batch_announcements': True,  # one message per guild per day instead of one per member
+    'members_per_embed': 25,  # Discord allows at most 25 fields per embed
+    'role_concurrency': 5,  # role add/remove calls in flight per reconcile
+    'member_query_batch': 100,  # user IDs per gateway member query (Discord's maximum)
+}
+
+# Random birthday wishes, one is picked per member
+BIRTHDAY_MESSAGES = [
+    "Hope your day is filled with joy and cake! 🎂",
+    "Another year of awesome! Have a great day! 🎈",
+    "Time to celebrate! Happy Birthday! 🎊",
+    "Wishing you the happiest of birthdays! 🎁",
+    "Have an amazing birthday celebration! 🎉"
+]
+
+# Announcement Dispatcher Settings
+DISPATCHER_SETTINGS = {
+    'concurrency': 10,  # messages in flight at once across all channels
+    'route_limit': 5,  # messages per channel...
+    'route_period': 5,  # ...per this many seconds
+    'max_retries': 3,
+    'retry_base_delay': 1,  # seconds, doubled after each retry
 }
 
 # Help Messages
@@ -45,15 +124,21 @@ HELP_TEXT = """
 
 🎵 Music Commands
 ------------------
-`!play <song>` - Play a song or add to queue
+`!play <song>` - Play a song or add to queue (playlist links queue every track)
 `!pause` - Pause current playback
-`!resume` - Resume playback
+`!resume` - Resume playback (or the song interrupted by a disconnect)
+`!seek <[H:]M:SS>` - Jump to a position in the current song
 `!skip` - Skip current song
+`!previous` - Play the previous song again
 `!stop` - Stop playback and clear queue
-`!queue` - Show current queue
+`!queue [page]` - Show current queue
+`!remove <position>` - Remove a song from the queue
+`!move <from> <to>` - Move a song within the queue
 `!shuffle` - Shuffle the queue
 `!loop [off/single/queue]` - Set loop mode
+`!fx [normalize/bass/nightcore/reset] [value]` - Show or change audio effects
 `!volume <0-100>` - Adjust volume
+`!prefetch [0-2]` - Show or set how many upcoming songs are preloaded
 `!controls` - Show music control panel
 
 🎂 Birthday Commands
@@ -62,6 +147,7 @@ HELP_TEXT = """
 `!upcoming_birthdays [days]` - Show upcoming birthdays
 `!set_birthday_channel #channel` - Set birthday announcement channel (Admin only)
 `!set_birthday_role @role` - Set birthday role (Admin only)
+`!set_timezone <zone>` - Set the server timezone for birthdays, e.g. Europe/London (Admin only)
 
 🎉 Holiday Commands
 ------------------
@@ -143,14 +229,23 @@ EMOJIS = {
 # Visualization Settings
 VISUALIZER = {
     'bars': ['▁', '▂', '▃', '▄', '▅', '▆', '▇', '█'],
-    'update_interval': 1,  # seconds
-    'length': 20  # number of bars
+    'update_interval': 2,  # fastest per-guild edit interval (seconds)
+    'max_interval': 30,  # slowest interval when a channel is rate limited
+    'tick': 0.25,  # how often due edits are started
+    'slow_edit': 1.0,  # edits slower than this were held back by a rate limit
+    'max_concurrent_edits': 10,
+    'length': 20,  # number of bars
+    'sample_every': 5,  # analyze one 20ms PCM frame out of this many
+    'downsample': 2,  # keep every n-th sample (48kHz -> 24kHz) before the FFT
+    'floor_db': 60,  # band energy shown as an empty bar
+    'range_db': 60,  # energy above the floor that fills a bar
+    'decay': 0.7  # per-update falloff of bar levels
 }
 
 # Command Categories
 CATEGORIES = {
-    'Music': ['play', 'pause', 'resume', 'skip', 'stop', 'queue', 'shuffle', 'loop', 'volume', 'controls'],
-    'Birthday': ['setbirthday', 'upcoming_birthdays', 'birthday_info', 'set_birthday_channel', 'set_birthday_role'],
+    'Music': ['play', 'pause', 'resume', 'seek', 'skip', 'previous', 'stop', 'queue', 'remove', 'move', 'shuffle', 'loop', 'volume', 'fx', 'prefetch', 'controls'],
+    'Birthday': ['setbirthday', 'upcoming_birthdays', 'birthday_info', 'set_birthday_channel', 'set_birthday_role', 'set_timezone'],
     'Holiday': ['next_holiday', 'upcoming_holidays'],
     'General': ['help', 'ping', 'serverinfo', 'userinfo', 'menu']
 }
@@ -181,7 +276,7 @@ DB_TABLES = {
 TIMEOUTS = {
     'voice_connection': 20,
     'api_request': 10,
-    'database': 5
+    'database': 15  # also how long a write waits for another shard process's lock
 }
 
 # Custom Welcome Messages
@@ -16,12 +16,32 @@ INTENTS.voice_states = True
 INTENTS.message_content = True
 INTENTS.members = True
 
+# Member cache: "full" caches every member of every guild, "low" caches only members
+# in voice channels and looks others up by ID when a job needs them
+MEMBER_CACHE = os.getenv('MEMBER_CACHE', 'full').lower()
+if MEMBER_CACHE == 'low':
+    MEMBER_CACHE_FLAGS = discord.MemberCacheFlags(voice=True, joined=False)
+else:
+    MEMBER_CACHE_FLAGS = discord.MemberCacheFlags.from_intents(INTENTS)
+
+# Sharding: leave SHARD_COUNT unset to let Discord pick the shard count, or set it
+# together with SHARD_IDS (e.g. "0-3" or "0,2,4") to split the shards across processes
+def _parse_shard_ids(value: str) -> list:
+    shard_ids = []
+    for part in value.split(','):
+        start, _, end = part.strip().partition('-')
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return shard_ids
+
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+SHARD_IDS = _parse_shard_ids(os.getenv('SHARD_IDS')) if os.getenv('SHARD_IDS') else None
+
 # Database configuration
 DATABASE_NAME = 'birthdays.db'
 
 # YTDL Options
 YTDL_OPTIONS = {
-    'format': 'bestaudio/best',
+    'format': 'bestaudio[acodec=opus]/bestaudio/best',  # Opus can be passed through to Discord
     'extractaudio': True,
     'audioformat': 'mp3',
     'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
@@ -46,6 +66,12 @@ FFMPEG_OPTIONS = {
 if not DISCORD_TOKEN:
     raise ValueError("No Discord token found. Please check your .env file.")
 
+if MEMBER_CACHE not in ('full', 'low'):
+    raise ValueError("MEMBER_CACHE must be 'full' or 'low'.")
+
+if SHARD_IDS is not None and (SHARD_COUNT is None or not all(0 <= shard < SHARD_COUNT for shard in SHARD_IDS)):
+    raise ValueError("SHARD_IDS needs SHARD_COUNT to be set and every shard ID below it.")
+
 # config/constants.py
 from datetime import datetime, date
 
@@ -4,21 +4,36 @@ from discord.ext import commands
 import asyncio
 import sys
 import traceback
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 # Import configurations
-from config.settings import DISCORD_TOKEN, BOT_PREFIX, INTENTS
+from config.settings import (DISCORD_TOKEN, BOT_PREFIX, INTENTS, SHARD_COUNT, SHARD_IDS,
+                             MEMBER_CACHE, MEMBER_CACHE_FLAGS)
 from utils.database import Database
+from utils.settings_cache import GuildSettingsCache
+from utils.dispatcher import AnnouncementDispatcher
+from utils.extraction import extraction_pool
+from utils.audio_cache import audio_cache
+from utils.voice_workers import voice_pool
 
-class MusicBot(commands.Bot):
-    """Custom bot class with additional functionality"""
+class MusicBot(commands.AutoShardedBot):
+    """Custom bot class with additional functionality
+
+    Runs every shard by default. With ``SHARD_COUNT`` and ``SHARD_IDS``
+    set, each process runs its own range of shards and only handles the
+    guilds on them; the processes share the SQLite database.
+    """
     
     def __init__(self):
         # Initialize the bot with configured settings
         super().__init__(
             command_prefix=BOT_PREFIX,
             intents=INTENTS,
+            shard_count=SHARD_COUNT,
+            shard_ids=SHARD_IDS,
+            member_cache_flags=MEMBER_CACHE_FLAGS,
+            chunk_guilds_at_startup=MEMBER_CACHE == 'full',
             help_command=None,  # Disable default help command
             activity=discord.Activity(
                 type=discord.ActivityType.competing,
@@ -28,6 +43,8 @@ class MusicBot(commands.Bot):
         
         # Initialize bot attributes
         self.db = Database()
+        self.settings = GuildSettingsCache(self.db)
+        self.dispatcher = AnnouncementDispatcher()
         self.start_time = datetime.utcnow()
         self.error_channel: Optional[discord.TextChannel] = None
         
@@ -41,7 +58,14 @@ class MusicBot(commands.Bot):
         
         # Initialize database
         print("Initializing database...")
-        self.db.init_db()
+        await self.db.init_db()
+        await self.settings.load(self.owns_guild)
+        
+        # Start the shared announcement dispatcher
+        self.dispatcher.start()
+        
+        # Start the voice worker processes, if enabled
+        voice_pool.start()
         
         # Load all cogs
         print("Loading extensions...")
@@ -60,6 +84,16 @@ class MusicBot(commands.Bot):
                 print(f"Failed to load extension {extension}.", file=sys.stderr)
                 traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)
 
+    def owns_guild(self, guild_id: int) -> bool:
+        """Whether a guild is on one of the shards this process runs"""
+        if self.shard_ids is None:
+            return True
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+
+    def owned_guilds(self) -> List[discord.Guild]:
+        """The guilds this process is responsible for in periodic jobs"""
+        return [guild for guild in self.guilds if self.owns_guild(guild.id)]
+
     async def on_error(self, event_method: str, *args, **kwargs):
         """Global error handler for all events"""
         exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -92,6 +126,10 @@ class MusicBot(commands.Bot):
         """Clean up before the bot closes"""
         print("Shutting down bot...")
         
+        # Remember what was playing so it can be resumed after a restart
+        for player in list(self.music_players.values()):
+            await player.save_position()
+        
         # Disconnect from all voice channels
         for voice_client in self.voice_clients:
             try:
@@ -99,6 +137,12 @@ class MusicBot(commands.Bot):
             except:
                 pass
         
+        # Stop the announcement dispatcher and the extraction pool
+        await self.dispatcher.close()
+        await extraction_pool.close()
+        await audio_cache.close()
+        await voice_pool.close()
+        
         # Cancel all tasks and clean up
         tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
         for task in tasks:
@@ -106,6 +150,9 @@ class MusicBot(commands.Bot):
         
         await super().close()
 
+        # Close the shared database connection
+        await self.db.close()
+
 async def run_bot():
     """Initialize and run the bot"""
     try:
@@ -0,0 +1,225 @@
+# utils/audio_cache.py
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+from config.settings import FFMPEG_OPTIONS
+from config.constants import AUDIO_CACHE
+from utils.extraction import extract_info, normalize_query
+
+class AudioCache:
+    """Size-bounded on-disk cache of frequently played tracks, stored as Ogg Opus
+
+    Plays are counted per track; once a track reaches ``play_threshold``
+    a background filler has FFmpeg write it to disk (copying the Opus
+    stream when the source already is Opus). Cached files are evicted
+    least recently used first once the directory outgrows ``max_bytes``.
+    Shard processes may share the directory; each one keeps its own
+    index and tolerates files the others evicted.
+    """
+
+    def __init__(self, directory: str = AUDIO_CACHE['directory'],
+                 max_bytes: int = AUDIO_CACHE['max_bytes'],
+                 threshold: int = AUDIO_CACHE['play_threshold'],
+                 enabled: bool = AUDIO_CACHE['enabled']):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.threshold = threshold
+        self.enabled = enabled
+        self.size = 0
+        self._files: 'OrderedDict[str, int]' = OrderedDict()  # file name -> size, least recent first
+        self._plays: 'OrderedDict[str, int]' = OrderedDict()
+        self._pending: 'OrderedDict[str, str]' = OrderedDict()  # file name -> track URL
+        self._work: Optional[asyncio.Event] = None
+        self._filler: Optional[asyncio.Task] = None
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.filled = 0
+        self.failed = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _name(url: str) -> str:
+        """File name for a track; different URLs of the same video share one file"""
+        return hashlib.sha1(normalize_query(url).encode()).hexdigest() + '.ogg'
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        """Index the files already on disk, oldest use first"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.part'):
+                # Left behind by an interrupted fill, unless another process is still writing it
+                pid = entry.name.rsplit('.', 2)[-2]
+                if not pid.isdigit() or int(pid) == os.getpid() or not self._process_alive(int(pid)):
+                    self._discard(entry.path)
+            elif entry.name.endswith('.ogg'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self.size += size
+        self._evict()
+
+    def lookup(self, url: Optional[str]) -> Optional[str]:
+        """Get the cached file for a track, marking it as recently used"""
+        if not self.enabled or not url:
+            return None
+        self.load()
+        name = self._name(url)
+        if name not in self._files:
+            self.misses += 1
+            return None
+
+        path = self._path(name)
+        try:
+            # The modification time carries the LRU order across restarts
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process sharing the directory
+            self.size -= self._files.pop(name)
+            self.misses += 1
+            return None
+        except OSError:
+            pass
+        self.hits += 1
+        self._files.move_to_end(name)
+        return path
+
+    def record_play(self, url: Optional[str]):
+        """Count a play, queueing the track for caching once it is popular enough"""
+        if not self.enabled or not url:
+            return
+        self.load()
+        name = self._name(url)
+        if name in self._files or name in self._pending:
+            return
+
+        plays = self._plays.pop(name, 0) + 1
+        self._plays[name] = plays
+        while len(self._plays) > AUDIO_CACHE['tracked_plays']:
+            self._plays.popitem(last=False)
+        if plays >= self.threshold:
+            del self._plays[name]
+            self._pending[name] = url
+            self._start()
+            self._work.set()
+
+    def _start(self):
+        """Start the background filler on first use"""
+        if self._filler is None:
+            self._work = asyncio.Event()
+            self._filler = asyncio.create_task(self._fill_loop())
+
+    async def _fill_loop(self):
+        """Write queued tracks to disk one at a time so playback keeps priority"""
+        while True:
+            if not self._pending:
+                self._work.clear()
+                await self._work.wait()
+                continue
+
+            name, url = self._pending.popitem(last=False)
+            try:
+                await self._fill(name, url)
+                self.filled += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"Error caching {url}: {e}")
+
+    async def _fill(self, name: str, url: str):
+        """Transcode one track into the cache directory"""
+        data = await extract_info(url)
+        if data.get('is_live') or (data.get('duration') or 0) > AUDIO_CACHE['max_duration']:
+            return
+
+        if data.get('acodec') == 'opus':
+            codec = ['-c:a', 'copy']
+        else:
+            codec = ['-c:a', 'libopus', '-b:a', AUDIO_CACHE['bitrate'], '-ar', '48000', '-ac', '2']
+        path = self._path(name)
+        part = f'{path}.{os.getpid()}.part'
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-nostdin', '-loglevel', 'error', *FFMPEG_OPTIONS['before_options'].split(),
+            '-i', data['url'], '-vn', '-map_metadata', '-1', *codec, '-f', 'ogg', '-y', part,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, error = await asyncio.wait_for(process.communicate(), AUDIO_CACHE['fill_timeout'])
+        except BaseException:
+            process.kill()
+            await process.wait()
+            self._discard(part)
+            raise
+        if process.returncode != 0:
+            self._discard(part)
+            raise RuntimeError(error.decode(errors='replace').strip()[-200:] or f"ffmpeg exited with {process.returncode}")
+
+        os.replace(part, path)
+        size = os.path.getsize(path)
+        self._files[name] = size
+        self.size += size
+        self._evict()
+
+    @staticmethod
+    def _process_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @staticmethod
+    def _discard(path: str):
+        """Remove a partial file if FFmpeg got as far as creating it"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Delete least recently used files until the cache fits its size limit"""
+        while self.size > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self.size -= size
+            self.evicted += 1
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error evicting {name} from the audio cache: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache size and hit/fill counters"""
+        return {
+            'files': len(self._files),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'queued': len(self._pending),
+            'filled': self.filled,
+            'failed': self.failed,
+            'evicted': self.evicted
+        }
+
+    async def close(self):
+        """Stop the background filler"""
+        if self._filler is not None:
+            self._filler.cancel()
+            await asyncio.gather(self._filler, return_exceptions=True)
+            self._filler = None
+
+audio_cache = AudioCache()
@@ -1,127 +1,373 @@
 # utils/database.py
+import asyncio
+import calendar
 import sqlite3
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, List, Optional, Tuple, Union
 from config.settings import DATABASE_NAME
+from config.constants import TIMEOUTS
+
+def _month_day(value) -> int:
+    """Encode a date (or an MM-DD string) as a sortable MMDD integer"""
+    if isinstance(value, str):
+        # Parse within a leap year so 02-29 is accepted
+        value = datetime.strptime(f"2000-{value}", "%Y-%m-%d")
+    return value.month * 100 + value.day
+
+def _celebrated_on(day: Union[date, str]) -> List[int]:
+    """Get the MMDD integers whose birthdays fall on a date (or an MM-DD string)
+
+    Outside leap years Feb 28 also covers Feb 29 birthdays, the same day
+    ``_next_occurrence`` lists them on. A bare MM-DD string has no year,
+    so it only matches itself.
+    """
+    month_day = _month_day(day)
+    if month_day == 228 and isinstance(day, date) and not calendar.isleap(day.year):
+        return [228, 229]
+    return [month_day]
+
+def _next_occurrence(month_day: int, today: date) -> date:
+    """Get the next date on or after today matching an MMDD integer"""
+    month, day = divmod(month_day, 100)
+    for year in (today.year, today.year + 1):
+        try:
+            candidate = date(year, month, day)
+        except ValueError:
+            # Feb 29 outside a leap year is celebrated on Feb 28
+            candidate = date(year, month, day - 1)
+        if candidate >= today:
+            return candidate
+    return candidate
+
+def _birthday_source(guild_id: Optional[int]) -> Tuple[str, tuple]:
+    """Get the FROM clause (and its params) for birthdays, optionally scoped to one guild"""
+    if guild_id is None:
+        return "birthdays b", ()
+    return ("birthday_members m JOIN birthdays b ON b.user_id = m.user_id AND m.guild_id = ?",
+            (guild_id,))
 
 class Database:
+    """Async database layer shared by all cogs through ``bot.db``
+
+    A single long-lived WAL-mode connection is owned by a dedicated
+    executor thread, so queries never block the event loop.
+    """
+
     def __init__(self):
         self.db_name = DATABASE_NAME
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+        self._conn: Optional[sqlite3.Connection] = None
 
-    def init_db(self):
+    def _connection(self) -> sqlite3.Connection:
+        """Open the connection on first use (always called from the database thread)"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.db_name,
+                timeout=TIMEOUTS['database'],
+                check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    async def _run(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run ``func(conn)`` on the database thread and await the result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(self._connection()))
+
+    async def _execute(self, query: str, params: tuple = ()):
+        """Execute a write statement and commit it"""
+        def execute(conn):
+            with conn:
+                conn.execute(query, params)
+        await self._run(execute)
+
+    async def _executemany(self, query: str, params: list):
+        """Execute a write statement for every parameter set in one transaction"""
+        def executemany(conn):
+            with conn:
+                conn.executemany(query, params)
+        await self._run(executemany)
+
+    async def _fetchone(self, query: str, params: tuple = ()):
+        """Execute a query and return the first row"""
+        return await self._run(lambda conn: conn.execute(query, params).fetchone())
+
+    async def _fetchall(self, query: str, params: tuple = ()) -> list:
+        """Execute a query and return all rows"""
+        return await self._run(lambda conn: conn.execute(query, params).fetchall())
+
+    async def init_db(self):
         """Initialize database tables"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            # Create birthdays table
-            c.execute('''CREATE TABLE IF NOT EXISTS birthdays
-                        (user_id INTEGER PRIMARY KEY, birthday TEXT)''')
-            
-            # Create birthday channels table
-            c.execute('''CREATE TABLE IF NOT EXISTS birthday_channels
-                        (guild_id INTEGER PRIMARY KEY, channel_id INTEGER)''')
-            
-            # Create birthday roles table
-            c.execute('''CREATE TABLE IF NOT EXISTS birthday_roles
-                        (guild_id INTEGER PRIMARY KEY, role_id INTEGER)''')
-
-            # Create holiday channels table
-            c.execute('''CREATE TABLE IF NOT EXISTS holiday_channels
-                        (guild_id INTEGER PRIMARY KEY, channel_id INTEGER)''')
-            conn.commit()
-
-    def store_birthday(self, user_id: int, birthday: datetime):
+        def init(conn):
+            with conn:
+                c = conn.cursor()
+                # Create birthdays table
+                c.execute('''CREATE TABLE IF NOT EXISTS birthdays
+                            (user_id INTEGER PRIMARY KEY, birthday TEXT, month_day INTEGER)''')
+
+                # Backfill the sortable MMDD column for databases created before it existed
+                columns = [row[1] for row in c.execute("PRAGMA table_info(birthdays)")]
+                if 'month_day' not in columns:
+                    c.execute("ALTER TABLE birthdays ADD COLUMN month_day INTEGER")
+                c.execute('''UPDATE birthdays
+                            SET month_day = CAST(substr(birthday, 1, 2) AS INTEGER) * 100
+                                          + CAST(substr(birthday, 4, 2) AS INTEGER)
+                            WHERE month_day IS NULL''')
+                c.execute('''CREATE INDEX IF NOT EXISTS idx_birthdays_month_day
+                            ON birthdays (month_day)''')
+
+                # Create guild membership table for users with a stored birthday
+                c.execute('''CREATE TABLE IF NOT EXISTS birthday_members
+                            (guild_id INTEGER, user_id INTEGER,
+                             PRIMARY KEY (guild_id, user_id)) WITHOUT ROWID''')
+                c.execute('''CREATE INDEX IF NOT EXISTS idx_birthday_members_user
+                            ON birthday_members (user_id)''')
+
+                # Create birthday channels table
+                c.execute('''CREATE TABLE IF NOT EXISTS birthday_channels
+                            (guild_id INTEGER PRIMARY KEY, channel_id INTEGER)''')
+
+                # Create birthday roles table
+                c.execute('''CREATE TABLE IF NOT EXISTS birthday_roles
+                            (guild_id INTEGER PRIMARY KEY, role_id INTEGER)''')
+
+                # Create holiday channels table
+                c.execute('''CREATE TABLE IF NOT EXISTS holiday_channels
+                            (guild_id INTEGER PRIMARY KEY, channel_id INTEGER)''')
+
+                # Create guild timezones table
+                c.execute('''CREATE TABLE IF NOT EXISTS guild_timezones
+                            (guild_id INTEGER PRIMARY KEY, timezone TEXT)''')
+
+                # Create per-guild music settings table
+                c.execute('''CREATE TABLE IF NOT EXISTS music_settings
+                            (guild_id INTEGER PRIMARY KEY, prefetch_depth INTEGER)''')
+
+                # Create birthday role holders table (who the bot last gave the role to)
+                c.execute('''CREATE TABLE IF NOT EXISTS birthday_role_holders
+                            (guild_id INTEGER, user_id INTEGER,
+                             PRIMARY KEY (guild_id, user_id)) WITHOUT ROWID''')
+
+                # Create birthday runs table (last local date processed per guild)
+                c.execute('''CREATE TABLE IF NOT EXISTS birthday_runs
+                            (guild_id INTEGER PRIMARY KEY, last_run TEXT)''')
+
+                # Create playback positions table (track to resume after a disconnect)
+                c.execute('''CREATE TABLE IF NOT EXISTS playback_positions
+                            (guild_id INTEGER PRIMARY KEY, query TEXT, title TEXT, position REAL)''')
+        await self._run(init)
+
+    async def close(self):
+        """Close the connection and stop the database thread"""
+        def close(conn):
+            conn.close()
+            self._conn = None
+        if self._conn is not None:
+            await self._run(close)
+        self._executor.shutdown(wait=True)
+
+    async def store_birthday(self, user_id: int, birthday: datetime):
         """Store user's birthday"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("INSERT OR REPLACE INTO birthdays VALUES (?, ?)", 
-                     (user_id, birthday.strftime("%m-%d")))
-            conn.commit()
+        await self._execute("INSERT OR REPLACE INTO birthdays (user_id, birthday, month_day) VALUES (?, ?, ?)",
+                            (user_id, birthday.strftime("%m-%d"), _month_day(birthday)))
+
+    async def get_birthday_users(self) -> set:
+        """Get the IDs of every user with a stored birthday"""
+        return {row[0] for row in await self._fetchall("SELECT user_id FROM birthdays")}
+
+    async def add_birthday_member(self, guild_id: int, user_id: int):
+        """Associate a user with a guild if they have a stored birthday"""
+        await self.add_birthday_members(guild_id, [user_id])
+
+    async def add_birthday_members(self, guild_id: int, user_ids: list):
+        """Associate the users that have a stored birthday with a guild"""
+        await self._executemany(
+            """INSERT OR IGNORE INTO birthday_members (guild_id, user_id)
+               SELECT ?, user_id FROM birthdays WHERE user_id = ?""",
+            [(guild_id, user_id) for user_id in user_ids])
 
-    def set_birthday_channel(self, guild_id: int, channel_id: int):
+    async def remove_birthday_member(self, guild_id: int, user_id: int):
+        """Drop a user's association with a guild"""
+        await self._execute("DELETE FROM birthday_members WHERE guild_id = ? AND user_id = ?",
+                            (guild_id, user_id))
+
+    async def clear_birthday_members(self, guild_id: int):
+        """Drop every birthday association for a guild"""
+        await self._execute("DELETE FROM birthday_members WHERE guild_id = ?", (guild_id,))
+
+    async def set_birthday_channel(self, guild_id: int, channel_id: int):
         """Set birthday announcement channel for a guild"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("INSERT OR REPLACE INTO birthday_channels VALUES (?, ?)", 
-                     (guild_id, channel_id))
-            conn.commit()
+        await self._execute("INSERT OR REPLACE INTO birthday_channels VALUES (?, ?)",
+                            (guild_id, channel_id))
 
-    def get_birthday_channel(self, guild_id: int) -> int:
+    async def get_birthday_channel(self, guild_id: int) -> int:
         """Get birthday announcement channel for a guild"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("SELECT channel_id FROM birthday_channels WHERE guild_id = ?", 
-                     (guild_id,))
-            result = c.fetchone()
-            return result[0] if result else None
-
-    def set_birthday_role(self, guild_id: int, role_id: int):
+        result = await self._fetchone("SELECT channel_id FROM birthday_channels WHERE guild_id = ?",
+                                      (guild_id,))
+        return result[0] if result else None
+
+    async def set_birthday_role(self, guild_id: int, role_id: int):
         """Set birthday role for a guild"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("INSERT OR REPLACE INTO birthday_roles VALUES (?, ?)", 
-                     (guild_id, role_id))
-            conn.commit()
+        await self._execute("INSERT OR REPLACE INTO birthday_roles VALUES (?, ?)",
+                            (guild_id, role_id))
 
-    def get_birthday_role(self, guild_id: int) -> int:
+    async def get_birthday_role(self, guild_id: int) -> int:
         """Get birthday role for a guild"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("SELECT role_id FROM birthday_roles WHERE guild_id = ?", 
-                     (guild_id,))
-            result = c.fetchone()
-            return result[0] if result else None
-
-    def get_todays_birthdays(self) -> list:
+        result = await self._fetchone("SELECT role_id FROM birthday_roles WHERE guild_id = ?",
+                                      (guild_id,))
+        return result[0] if result else None
+
+    async def get_todays_birthdays(self, guild_id: Optional[int] = None) -> list:
         """Get list of user IDs who have birthdays today"""
-        today = datetime.now().strftime("%m-%d")
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("SELECT user_id FROM birthdays WHERE birthday = ?", (today,))
-            return [user_id for (user_id,) in c.fetchall()]
-
-    def get_upcoming_birthdays(self, days: int = 30) -> list:
-        """Get list of upcoming birthdays within specified days"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        
-        today = datetime.now()
+        return await self.get_birthdays_for_date(date.today(), guild_id)
+
+    async def get_upcoming_birthdays(self, days: int = 30, guild_id: Optional[int] = None,
+                                     today: Optional[date] = None) -> List[Tuple[int, date, int]]:
+        """Get upcoming birthdays within specified days
+
+        Returns ``(user_id, next_birthday, days_until)`` tuples sorted by
+        ``days_until``. A window that wraps past Dec 31 is served by two
+        index range scans. With ``guild_id`` only that guild's members are
+        returned.
+        """
+        today = today or date.today()
+        start = _month_day(today)
+        # A window ending on Feb 28 of a non-leap year also takes in Feb 29 birthdays
+        end = max(_celebrated_on(today + timedelta(days=days - 1)))
+        source, scope = _birthday_source(guild_id)
+        query = (f"SELECT b.user_id, b.month_day FROM {source} "
+                 "WHERE b.month_day BETWEEN ? AND ? ORDER BY b.month_day")
+
+        def upcoming_birthdays(conn):
+            if start <= end:
+                return conn.execute(query, scope + (start, end)).fetchall()
+            # The window wraps into next year: rest of this year, then the start of next
+            return (conn.execute(query, scope + (start, 1231)).fetchall()
+                    + conn.execute(query, scope + (101, end)).fetchall())
+
         upcoming = []
-        
-        for i in range(days):
-            date = (today + timedelta(days=i)).strftime("%m-%d")
-            c.execute("SELECT user_id, birthday FROM birthdays WHERE birthday = ?", 
-                     (date,))
-            results = c.fetchall()
-            for user_id, birthday in results:
-                birthday_date = datetime.strptime(birthday, "%m-%d").replace(
-                    year=today.year)
-                upcoming.append((user_id, birthday_date))
-        
-        conn.close()
-        return sorted(upcoming, key=lambda x: x[1])
-
-    def get_birthdays_for_date(self, date_str: str) -> list:
-        """Get all user IDs who have birthdays on a specific date"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("SELECT user_id FROM birthdays WHERE birthday = ?", (date_str,))
-            return [row[0] for row in c.fetchall()]
-
-    def set_holiday_channel(self, guild_id: int, channel_id: int):
+        for user_id, month_day in await self._run(upcoming_birthdays):
+            next_birthday = _next_occurrence(month_day, today)
+            upcoming.append((user_id, next_birthday, (next_birthday - today).days))
+        return upcoming
+
+    async def get_birthdays_for_date(self, day: Union[date, str], guild_id: Optional[int] = None) -> list:
+        """Get all user IDs who celebrate their birthday on a date (or an MM-DD string)"""
+        source, scope = _birthday_source(guild_id)
+        month_days = _celebrated_on(day)
+        placeholders = ", ".join("?" for _ in month_days)
+        rows = await self._fetchall(f"SELECT b.user_id FROM {source} WHERE b.month_day IN ({placeholders})",
+                                    scope + tuple(month_days))
+        return [row[0] for row in rows]
+
+    async def get_birthday_channels(self) -> dict:
+        """Get the birthday announcement channel of every guild"""
+        return dict(await self._fetchall("SELECT guild_id, channel_id FROM birthday_channels"))
+
+    async def get_birthday_roles(self) -> dict:
+        """Get the birthday role of every guild"""
+        return dict(await self._fetchall("SELECT guild_id, role_id FROM birthday_roles"))
+
+    async def get_holiday_channels(self) -> dict:
+        """Get the holiday announcement channel of every guild"""
+        return dict(await self._fetchall("SELECT guild_id, channel_id FROM holiday_channels"))
+
+    async def get_birthday_guilds(self, days: list) -> set:
+        """Get the IDs of guilds with at least one member's birthday on any of the dates (or MM-DD strings)"""
+        month_days = [month_day for day in days for month_day in _celebrated_on(day)]
+        placeholders = ", ".join("?" for _ in month_days)
+        rows = await self._fetchall(
+            f"""SELECT DISTINCT m.guild_id FROM birthdays b
+                JOIN birthday_members m ON m.user_id = b.user_id
+                WHERE b.month_day IN ({placeholders})""",
+            tuple(month_days))
+        return {guild_id for (guild_id,) in rows}
+
+    async def get_birthday_runs(self) -> dict:
+        """Get the last local date (ISO format) the birthday job ran for every guild"""
+        return dict(await self._fetchall("SELECT guild_id, last_run FROM birthday_runs"))
+
+    async def set_birthday_runs(self, runs: dict):
+        """Record the local date the birthday job last ran for each guild"""
+        await self._executemany("INSERT OR REPLACE INTO birthday_runs VALUES (?, ?)",
+                                list(runs.items()))
+
+    async def get_birthday_role_holders(self, guild_id: int) -> set:
+        """Get the members the birthday role was last applied to in a guild"""
+        rows = await self._fetchall("SELECT user_id FROM birthday_role_holders WHERE guild_id = ?",
+                                    (guild_id,))
+        return {user_id for (user_id,) in rows}
+
+    async def set_birthday_role_holders(self, guild_id: int, user_ids: set):
+        """Replace the recorded birthday role holders for a guild"""
+        def set_holders(conn):
+            with conn:
+                conn.execute("DELETE FROM birthday_role_holders WHERE guild_id = ?", (guild_id,))
+                conn.executemany("INSERT INTO birthday_role_holders VALUES (?, ?)",
+                                 [(guild_id, user_id) for user_id in user_ids])
+        await self._run(set_holders)
+
+    async def get_role_holder_guilds(self) -> set:
+        """Get the IDs of guilds where the birthday role is currently applied to someone"""
+        rows = await self._fetchall("SELECT DISTINCT guild_id FROM birthday_role_holders")
+        return {guild_id for (guild_id,) in rows}
+
+    async def set_timezone(self, guild_id: int, timezone: str):
+        """Set the timezone for a guild"""
+        await self._execute("INSERT OR REPLACE INTO guild_timezones VALUES (?, ?)",
+                            (guild_id, timezone))
+
+    async def get_timezone(self, guild_id: int) -> str:
+        """Get the timezone for a guild"""
+        result = await self._fetchone("SELECT timezone FROM guild_timezones WHERE guild_id = ?",
+                                      (guild_id,))
+        return result[0] if result else None
+
+    async def get_timezones(self) -> dict:
+        """Get the timezone of every guild"""
+        return dict(await self._fetchall("SELECT guild_id, timezone FROM guild_timezones"))
+
+    async def set_prefetch_depth(self, guild_id: int, depth: int):
+        """Set how many upcoming tracks are prefetched for a guild"""
+        await self._execute("INSERT OR REPLACE INTO music_settings (guild_id, prefetch_depth) VALUES (?, ?)",
+                            (guild_id, depth))
+
+    async def get_prefetch_depth(self, guild_id: int) -> int:
+        """Get how many upcoming tracks are prefetched for a guild"""
+        result = await self._fetchone("SELECT prefetch_depth FROM music_settings WHERE guild_id = ?",
+                                      (guild_id,))
+        return result[0] if result else None
+
+    async def get_prefetch_depths(self) -> dict:
+        """Get the prefetch depth of every guild"""
+        return dict(await self._fetchall("SELECT guild_id, prefetch_depth FROM music_settings"))
+
+    async def set_holiday_channel(self, guild_id: int, channel_id: int):
         """Set holiday announcement channel for a guild"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("INSERT OR REPLACE INTO holiday_channels VALUES (?, ?)",
-                     (guild_id, channel_id))
-            conn.commit()
+        await self._execute("INSERT OR REPLACE INTO holiday_channels VALUES (?, ?)",
+                            (guild_id, channel_id))
 
-    def get_holiday_channel(self, guild_id: int) -> int:
+    async def get_holiday_channel(self, guild_id: int) -> int:
         """Get holiday announcement channel for a guild"""
-        with sqlite3.connect(self.db_name) as conn:
-            c = conn.cursor()
-            c.execute("SELECT channel_id FROM holiday_channels WHERE guild_id = ?",
-                     (guild_id,))
-            result = c.fetchone()
-            return result[0] if result else None
+        result = await self._fetchone("SELECT channel_id FROM holiday_channels WHERE guild_id = ?",
+                                      (guild_id,))
+        return result[0] if result else None
+
+    async def save_playback_position(self, guild_id: int, query: str, title: str, position: float):
+        """Remember where a guild's track stopped so it can be resumed"""
+        await self._execute("INSERT OR REPLACE INTO playback_positions VALUES (?, ?, ?, ?)",
+                            (guild_id, query, title, position))
+
+    async def get_playback_position(self, guild_id: int) -> tuple:
+        """Get a guild's saved (query, title, position), if any"""
+        return await self._fetchone("SELECT query, title, position FROM playback_positions WHERE guild_id = ?",
+                                    (guild_id,))
+
+    async def clear_playback_position(self, guild_id: int):
+        """Forget a guild's saved playback position"""
+        await self._execute("DELETE FROM playback_positions WHERE guild_id = ?", (guild_id,))
 
 # utils/__init__.py
 """
@@ -0,0 +1,222 @@
+# utils/dispatcher.py
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+import aiohttp
+import discord
+from config.constants import DISPATCHER_SETTINGS
+
+class RouteBucket:
+    """Sliding-window limiter for a single message route (one channel)
+
+    Messages that can't go out yet wait in ``waiting``, in order, instead
+    of holding up a worker; a timer hands the oldest one back to the
+    dispatcher's queue once the route frees up.
+    """
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.sent = deque()
+        self.blocked_until = 0.0
+        self.waiting = deque()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def delay(self) -> float:
+        """Seconds until a message can be sent on this route (0 if one can go now)"""
+        now = time.monotonic()
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+        wait = self.blocked_until - now
+        if len(self.sent) >= self.limit:
+            wait = max(wait, self.period - (now - self.sent[0]))
+        return max(wait, 0.0)
+
+    def take(self):
+        """Count a message as sent on this route"""
+        self.sent.append(time.monotonic())
+
+    def block(self, seconds: float):
+        """Hold the route for a server-provided retry-after delay"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class Announcement:
+    """A queued message and its retry state"""
+
+    __slots__ = ('channel', 'kwargs', 'future', 'attempt', 'delay', 'released')
+
+    def __init__(self, channel: discord.abc.Messageable, kwargs: dict, future: asyncio.Future):
+        self.channel = channel
+        self.kwargs = kwargs
+        self.future = future
+        self.attempt = 0
+        self.delay = DISPATCHER_SETTINGS['retry_base_delay']
+        self.released = False  # handed back by its route's timer, so it goes ahead of the waiting ones
+
+class AnnouncementDispatcher:
+    """Shared queue for announcement messages
+
+    Messages are sent by a fixed number of workers so one slow channel does
+    not hold up the rest: a message whose channel is rate limited, or that
+    is backing off after a transient failure, waits on the channel's own
+    bucket rather than in a worker.
+    """
+
+    def __init__(self, concurrency: int = DISPATCHER_SETTINGS['concurrency']):
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.buckets: Dict[int, RouteBucket] = {}
+        self.workers = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._burst_start: Optional[float] = None
+        self._burst_sent = 0
+
+    def start(self):
+        """Start the worker tasks"""
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        """Stop the worker tasks, dropping anything still queued"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        for bucket in self.buckets.values():
+            if bucket.timer:
+                bucket.timer.cancel()
+                bucket.timer = None
+            bucket.waiting.clear()
+
+    def enqueue(self, channel: discord.abc.Messageable, **kwargs) -> asyncio.Future:
+        """Queue a message for a channel without waiting for it to be sent
+
+        Returns a future resolving to the sent message (or None on failure).
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._burst_start is None:
+            self._burst_start = time.monotonic()
+        self.pending += 1
+        self._idle.clear()
+        self.queue.put_nowait(Announcement(channel, kwargs, future))
+        return future
+
+    async def join(self):
+        """Wait until every queued message has been handled"""
+        await self._idle.wait()
+
+    def stats(self) -> dict:
+        """Get dispatcher counters"""
+        return {
+            'queued': self.pending,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried
+        }
+
+    def _bucket(self, channel) -> RouteBucket:
+        """Get the rate-limit bucket for a channel"""
+        bucket = self.buckets.get(channel.id)
+        if bucket is None:
+            bucket = RouteBucket(DISPATCHER_SETTINGS['route_limit'], DISPATCHER_SETTINGS['route_period'])
+            self.buckets[channel.id] = bucket
+        return bucket
+
+    async def _worker(self):
+        """Send queued messages until cancelled"""
+        while True:
+            announcement = await self.queue.get()
+            self.queue.task_done()
+            try:
+                bucket = self._bucket(announcement.channel)
+                if bucket.waiting and not announcement.released:
+                    # Keep the channel's messages in order behind the ones already waiting
+                    bucket.waiting.append(announcement)
+                    continue
+                announcement.released = False
+                if bucket.delay() > 0:
+                    self._park(bucket, announcement)
+                    continue
+                bucket.take()
+                self._schedule(bucket)
+                await self._send(bucket, announcement)
+            except Exception as e:
+                # e.g. a channel that can't take messages; never let one announcement stop the worker
+                print(f"Dropping announcement for channel {getattr(announcement.channel, 'id', announcement.channel)}: {e!r}")
+                self._finish(announcement, None, failed=True)
+
+    def _park(self, bucket: RouteBucket, announcement: Announcement):
+        """Put a message at the front of its route's waiting line"""
+        bucket.waiting.appendleft(announcement)
+        self._schedule(bucket)
+
+    def _schedule(self, bucket: RouteBucket):
+        """Make sure the route's next waiting message is released when the route frees up"""
+        if bucket.timer is None and bucket.waiting:
+            bucket.timer = asyncio.get_running_loop().call_later(bucket.delay(), self._release, bucket)
+
+    def _release(self, bucket: RouteBucket):
+        """Hand the oldest waiting message of a route back to the workers"""
+        bucket.timer = None
+        if bucket.waiting:
+            announcement = bucket.waiting.popleft()
+            announcement.released = True
+            self.queue.put_nowait(announcement)
+
+    async def _send(self, bucket: RouteBucket, announcement: Announcement):
+        """Try to send one message, parking it for a retry after transient failures"""
+        channel = announcement.channel
+        try:
+            message = await channel.send(**announcement.kwargs)
+        except discord.RateLimited as e:
+            bucket.block(e.retry_after)
+        except (discord.Forbidden, discord.NotFound) as e:
+            # Permanent for this channel; retrying will not help
+            print(f"Dropping announcement for channel {channel.id}: {e}")
+            return self._finish(announcement, None, failed=True)
+        except discord.HTTPException as e:
+            if e.status < 500 and e.status != 429:
+                print(f"Dropping announcement for channel {channel.id}: {e}")
+                return self._finish(announcement, None, failed=True)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            pass
+        else:
+            self.sent += 1
+            self._burst_sent += 1
+            return self._finish(announcement, message)
+
+        if announcement.attempt >= DISPATCHER_SETTINGS['max_retries']:
+            return self._finish(announcement, None, failed=True)
+        # Back off on the channel's own bucket, so only this channel waits
+        self.retried += 1
+        announcement.attempt += 1
+        bucket.block(announcement.delay)
+        announcement.delay *= 2
+        self._park(bucket, announcement)
+
+    def _finish(self, announcement: Announcement, message: Optional[discord.Message], *, failed: bool = False):
+        """Resolve a message's future once it was sent or given up on"""
+        if failed:
+            self.failed += 1
+        if not announcement.future.done():
+            announcement.future.set_result(message)
+        self.pending -= 1
+        if self.pending == 0:
+            self._report_burst()
+            self._idle.set()
+
+    def _report_burst(self):
+        """Print the throughput of the burst that just drained"""
+        if self._burst_start is None:
+            return
+        elapsed = max(time.monotonic() - self._burst_start, 1e-6)
+        print(f"Dispatched {self._burst_sent} announcements in {elapsed:.1f}s "
+              f"({self._burst_sent / elapsed:.1f} msg/s, {self.failed} failed total)")
+        self._burst_start = None
+        self._burst_sent = 0
@@ -0,0 +1,144 @@
+# utils/effects.py
+from typing import Optional
+import numpy as np
+import discord
+from config.constants import EFFECTS_SETTINGS
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+
+class AudioEffects:
+    """Effect settings chosen for one player, shared by all of its sources"""
+
+    def __init__(self):
+        self.normalize = False
+        self.bass = 0  # boost level, 0 to len(EFFECTS_SETTINGS['bass_levels']) - 1
+        self.nightcore = False
+
+    @property
+    def speed(self) -> float:
+        """Playback speed the FFmpeg stream is rendered at"""
+        return EFFECTS_SETTINGS['nightcore_rate'] if self.nightcore else 1.0
+
+    def active(self) -> bool:
+        """Whether any effect needs the decoded PCM"""
+        return self.normalize or bool(self.bass) or self.nightcore
+
+    def ffmpeg_filter(self) -> str:
+        """The FFmpeg -af chain for effects that change the stream's timeline"""
+        if not self.nightcore:
+            return ''
+        rate = int(48000 * EFFECTS_SETTINGS['nightcore_rate'])
+        # asetrate scales whatever rate comes in, so bring the input to 48 kHz first
+        return f'aresample=48000,asetrate={rate},aresample=48000'
+
+    def apply(self, name: str, value: Optional[str] = None) -> bool:
+        """Change one effect from user input, returning whether the stream timeline changed
+
+        ``normalize`` and ``nightcore`` take on/off and toggle without a
+        value; ``bass`` takes a level; ``reset`` turns everything off.
+        """
+        nightcore = self.nightcore
+        if name == 'reset':
+            self.normalize, self.bass, self.nightcore = False, 0, False
+        elif name in ('normalize', 'nightcore'):
+            if value is None:
+                enabled = not getattr(self, name)
+            elif value.lower() in ('on', 'off'):
+                enabled = value.lower() == 'on'
+            else:
+                raise ValueError(f"Use `on` or `off` for {name}.")
+            setattr(self, name, enabled)
+        elif name == 'bass':
+            max_level = len(EFFECTS_SETTINGS['bass_levels']) - 1
+            if value is None:
+                level = (self.bass + 1) % (max_level + 1)
+            elif value.isdigit() and int(value) <= max_level:
+                level = int(value)
+            else:
+                raise ValueError(f"Bass boost level must be between 0 and {max_level}.")
+            self.bass = level
+        else:
+            raise ValueError("Unknown effect. Use normalize, bass, nightcore or reset.")
+        return self.nightcore != nightcore
+
+    def describe(self) -> str:
+        """Short human readable summary"""
+        active = []
+        if self.normalize:
+            active.append("normalize")
+        if self.bass:
+            active.append(f"bass {self.bass}")
+        if self.nightcore:
+            active.append("nightcore")
+        return ", ".join(active) or "none"
+
+class EffectsChain:
+    """Per-source DSP applied to each 20ms PCM frame
+
+    All work happens in buffers allocated once per source: the incoming
+    int16 frame is widened into a float32 work buffer, every effect updates
+    that buffer in place, and the result is narrowed back into a reusable
+    int16 buffer. At 100% volume with no effects the frame is passed
+    through untouched.
+    """
+
+    def __init__(self, effects: AudioEffects):
+        self.effects = effects
+        window = EFFECTS_SETTINGS['bass_window']
+        self._work = np.zeros((SAMPLES_PER_FRAME, 2), dtype=np.float32)
+        self._scratch = np.zeros((SAMPLES_PER_FRAME, 2), dtype=np.float32)
+        self._out = np.zeros((SAMPLES_PER_FRAME, 2), dtype=np.int16)
+        # Bass boost: a moving average over the last `window` samples, carried across frames
+        self._history = np.zeros((window - 1 + SAMPLES_PER_FRAME, 2), dtype=np.float64)
+        self._sums = np.zeros((window + SAMPLES_PER_FRAME, 2), dtype=np.float64)
+        # Normalization: gain ramps from the previous frame's value to avoid zipper noise
+        self._gain = 1.0
+        self._ramp = np.linspace(0, 1, SAMPLES_PER_FRAME, dtype=np.float32)[:, None]
+        self._gain_ramp = np.zeros((SAMPLES_PER_FRAME, 1), dtype=np.float32)
+
+    def process(self, frame: bytes, volume: float) -> bytes:
+        """Apply volume and the enabled effects to one frame"""
+        effects = self.effects
+        if len(frame) != FRAME_SIZE or (volume == 1.0 and not effects.normalize and not effects.bass):
+            return frame
+
+        work = self._work
+        np.copyto(work, np.frombuffer(frame, dtype=np.int16).reshape(-1, 2))
+        if effects.bass:
+            self._bass_boost(work, EFFECTS_SETTINGS['bass_levels'][effects.bass])
+        if effects.normalize:
+            self._normalize(work)
+        if volume != 1.0:
+            work *= volume
+
+        np.clip(work, -32768, 32767, out=work)
+        np.copyto(self._out, work, casting='unsafe')
+        return self._out.tobytes()
+
+    def _bass_boost(self, work: np.ndarray, gain: float):
+        """Add a gain-scaled low-passed copy of the signal to itself"""
+        window = EFFECTS_SETTINGS['bass_window']
+        history, sums = self._history, self._sums
+        history[:window - 1] = history[SAMPLES_PER_FRAME:]
+        history[window - 1:] = work
+        np.cumsum(history, axis=0, out=sums[1:])
+        low = self._scratch
+        np.subtract(sums[window:], sums[:-window], out=low, casting='unsafe')
+        low *= gain / window
+        work += low
+
+    def _normalize(self, work: np.ndarray):
+        """Level loudness towards a target RMS with a smoothed, bounded gain"""
+        rms = float(np.sqrt(np.vdot(work, work) / work.size))
+        target = self._gain
+        if rms > EFFECTS_SETTINGS['normalize_gate']:
+            desired = min(max(EFFECTS_SETTINGS['normalize_target'] / rms, EFFECTS_SETTINGS['normalize_min_gain']),
+                          EFFECTS_SETTINGS['normalize_max_gain'])
+            target += (desired - self._gain) * EFFECTS_SETTINGS['normalize_speed']
+
+        ramp = self._gain_ramp
+        np.multiply(self._ramp, target - self._gain, out=ramp)
+        ramp += self._gain
+        work *= ramp
+        self._gain = target
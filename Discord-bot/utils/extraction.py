@@ -0,0 +1,300 @@
+# utils/extraction.py
+import asyncio
+import multiprocessing
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import yt_dlp
+from config.settings import YTDL_OPTIONS
+from config.constants import EXTRACTION_SETTINGS
+
+# Each pool worker (process or thread) builds its own extractor on first use
+_worker_state = threading.local()
+
+YOUTUBE_ID = re.compile(r'^[\w-]{11}$')
+
+def normalize_query(query: str) -> str:
+    """Get a cache key for a search query or URL
+
+    YouTube links in any of their forms map to the video ID, other URLs
+    drop their fragment, and searches are case and whitespace insensitive.
+    """
+    query = query.strip()
+    parsed = urlparse(query)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return 'search:' + ' '.join(query.lower().split())
+
+    host = parsed.netloc.lower().removeprefix('www.').removeprefix('m.').removeprefix('music.')
+    video_id = None
+    if host == 'youtu.be':
+        video_id = parsed.path.lstrip('/').split('/')[0]
+    elif host == 'youtube.com':
+        if parsed.path == '/watch':
+            video_id = parse_qs(parsed.query).get('v', [None])[0]
+        elif parsed.path.startswith(('/shorts/', '/embed/', '/live/')):
+            video_id = parsed.path.split('/')[2]
+    if video_id and YOUTUBE_ID.match(video_id):
+        return 'youtube:' + video_id
+
+    return f'url:{host}{parsed.path}' + (f'?{parsed.query}' if parsed.query else '')
+
+def stream_expiry(data: Dict[str, Any]) -> Optional[float]:
+    """Get the Unix time a signed stream URL stops working, if it says"""
+    url = data.get('url')
+    if not url:
+        return None
+    expire = parse_qs(urlparse(url).query).get('expire', [None])[0]
+    try:
+        return float(expire) if expire else None
+    except ValueError:
+        return None
+
+class ExtractionCache:
+    """TTL + LRU cache of extracted track metadata and stream URLs
+
+    An entry expires after ``ttl`` seconds or shortly before its signed
+    stream URL does, whichever comes first.
+    """
+
+    def __init__(self, max_size: int = EXTRACTION_SETTINGS['cache_size'],
+                 ttl: float = EXTRACTION_SETTINGS['cache_ttl'],
+                 margin: float = EXTRACTION_SETTINGS['stream_url_margin']):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.margin = margin
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """Get cached data for a query, or None if missing or expired"""
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, query: str, data: Dict[str, Any]):
+        """Cache data under the query and the track's own page URL"""
+        expires_at = time.time() + self.ttl
+        stream_expires = stream_expiry(data)
+        if stream_expires is not None:
+            expires_at = min(expires_at, stream_expires - self.margin)
+        if expires_at <= time.time():
+            return
+
+        keys = {normalize_query(query)}
+        if data.get('webpage_url'):
+            keys.add(normalize_query(data['webpage_url']))
+        for key in keys:
+            self._entries[key] = (expires_at, data)
+            self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Get cache counters"""
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+extraction_cache = ExtractionCache()
+
+def is_playlist_url(query: str) -> bool:
+    """Check whether a query is a link to a playlist rather than a single track"""
+    parsed = urlparse(query.strip())
+    if parsed.scheme not in ('http', 'https'):
+        return False
+    host = parsed.netloc.lower().removeprefix('www.').removeprefix('m.').removeprefix('music.')
+    if host == 'youtube.com':
+        params = parse_qs(parsed.query)
+        # A watch link inside a playlist still plays just that video
+        return parsed.path == '/playlist' or ('list' in params and 'v' not in params)
+    if host == 'soundcloud.com':
+        return '/sets/' in parsed.path
+    return False
+
+def _extract(query: str, download: bool, playlist_items: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Run one extraction inside a pool worker (thread or process)
+
+    Each worker reuses its own YoutubeDL instance, and the result is
+    sanitized so it can be sent back from a worker process. Playlist pages
+    use a one-off flat extractor limited to ``playlist_items`` (1-based,
+    inclusive).
+    """
+    if playlist_items is not None:
+        start, end = playlist_items
+        extractor = yt_dlp.YoutubeDL({
+            **YTDL_OPTIONS,
+            'noplaylist': False,
+            'extract_flat': 'in_playlist',
+            'playliststart': start,
+            'playlistend': end,
+        })
+        return extractor.sanitize_info(extractor.extract_info(query, download=False))
+
+    extractor = getattr(_worker_state, 'ytdl', None)
+    if extractor is None:
+        extractor = _worker_state.ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
+    return extractor.sanitize_info(extractor.extract_info(query, download=download))
+
+class ExtractionPool:
+    """Dedicated, bounded pool for yt-dlp extraction
+
+    Runs at most ``workers`` extractions at once on its own thread or
+    process pool. Pending requests are queued per guild and served round
+    robin, so one guild spamming ``!play`` cannot starve the others. A
+    request that exceeds ``timeout`` fails, but its worker slot stays taken
+    until the extraction actually finishes.
+    """
+
+    def __init__(self, workers: int = EXTRACTION_SETTINGS['workers'],
+                 mode: str = EXTRACTION_SETTINGS['mode'],
+                 timeout: float = EXTRACTION_SETTINGS['timeout']):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown extraction mode: {mode}")
+        self.workers = workers
+        self.mode = mode
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._pending: 'OrderedDict[Optional[int], Deque[tuple]]' = OrderedDict()
+        self._work: Optional[asyncio.Event] = None
+        self._runners = []
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+
+    def _start(self):
+        """Create the executor and runner tasks on first use"""
+        if self._executor is not None:
+            return
+        if self.mode == 'process':
+            # A forked copy of the bot would inherit its event loop and threads
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='extraction')
+        self._work = asyncio.Event()
+        self._runners = [asyncio.create_task(self._runner()) for _ in range(self.workers)]
+
+    async def submit(self, query: str, *, guild_id: Optional[int] = None, download: bool = False,
+                     playlist_items: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """Queue an extraction for a guild and wait for its result"""
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(guild_id, deque()).append(
+            (query, download, playlist_items, future, time.monotonic()))
+        self._work.set()
+        return await future
+
+    def _next_job(self) -> Optional[tuple]:
+        """Take the next job, rotating between guilds"""
+        while self._pending:
+            guild_id, jobs = next(iter(self._pending.items()))
+            job = jobs.popleft()
+            if jobs:
+                self._pending.move_to_end(guild_id)
+            else:
+                del self._pending[guild_id]
+            if not job[3].done():
+                return job
+        return None
+
+    async def _runner(self):
+        """Feed jobs to one executor slot until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._work.clear()
+                await self._work.wait()
+                continue
+
+            query, download, playlist_items, future, queued_at = job
+            self.total_wait += time.monotonic() - queued_at
+            self.in_flight += 1
+            work = loop.run_in_executor(self._executor, _extract, query, download, playlist_items)
+            try:
+                done, _ = await asyncio.wait({work}, timeout=self.timeout)
+                if not done:
+                    self.timeouts += 1
+                    if not future.done():
+                        future.set_exception(asyncio.TimeoutError(
+                            f"Extraction timed out after {self.timeout}s"))
+                    # Keep the slot busy until the worker is actually free again
+                    await asyncio.wait({work})
+                    work.exception()
+                    continue
+
+                error = work.exception()
+                if error is not None:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(error)
+                else:
+                    self.completed += 1
+                    if not future.done():
+                        future.set_result(work.result())
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """Get queue depth and throughput counters"""
+        finished = self.completed + self.failed + self.timeouts
+        return {
+            'mode': self.mode,
+            'workers': self.workers,
+            'queued': sum(len(jobs) for jobs in self._pending.values()),
+            'queued_per_guild': {guild_id: len(jobs) for guild_id, jobs in self._pending.items()},
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'avg_wait': self.total_wait / finished if finished else 0.0
+        }
+
+    async def close(self):
+        """Stop the runners and shut the executor down"""
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+extraction_pool = ExtractionPool()
+
+async def extract_info(query: str, *, guild_id: Optional[int] = None,
+                       download: bool = False) -> Dict[str, Any]:
+    """Extract a single track's info, served from the cache when possible"""
+    if not download:
+        data = extraction_cache.get(query)
+        if data is not None:
+            return data
+
+    data = await extraction_pool.submit(query, guild_id=guild_id, download=download)
+    if 'entries' in data:
+        # Take first item from a playlist
+        data = data['entries'][0]
+
+    extraction_cache.put(query, data)
+    return data
+
+async def extract_playlist_page(url: str, start: int, end: int, *,
+                                guild_id: Optional[int] = None) -> Dict[str, Any]:
+    """Flat-extract entries ``start``..``end`` (1-based, inclusive) of a playlist"""
+    data = await extraction_pool.submit(url, guild_id=guild_id, playlist_items=(start, end))
+    data['entries'] = [entry for entry in data.get('entries') or [] if entry]
+    return data
@@ -0,0 +1,96 @@
+# utils/holiday_calendar.py
+import calendar
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+from config.constants import HOLIDAYS
+
+HolidayRule = Union[str, Tuple[int, int], Tuple[int, int, int]]
+
+def easter_date(year: int) -> date:
+    """Get Western (Gregorian) Easter Sunday using the anonymous computus"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """Get the nth weekday of a month (a negative n counts from the end)"""
+    if n > 0:
+        first = date(year, month, 1)
+        offset = (weekday - first.weekday()) % 7
+        return first + timedelta(days=offset + 7 * (n - 1))
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    offset = (last.weekday() - weekday) % 7
+    return last - timedelta(days=offset + 7 * (-n - 1))
+
+def holiday_date(rule: HolidayRule, year: int) -> date:
+    """Resolve a holiday rule from ``HOLIDAYS`` to a date in the given year
+
+    Rules are ``(month, day)`` for fixed dates, ``(month, weekday, n)`` for
+    the nth weekday of a month, or ``'easter'``.
+    """
+    if rule == 'easter':
+        return easter_date(year)
+    if len(rule) == 3:
+        return nth_weekday(year, *rule)
+    return date(year, *rule)
+
+class HolidayCalendar:
+    """Sorted holiday dates for a rolling window of years
+
+    Dates are computed once per window, and lookups bisect the sorted list.
+    """
+
+    def __init__(self, holidays: Dict[str, HolidayRule] = HOLIDAYS, years: int = 3):
+        self.holidays = holidays
+        self.years = years
+        self._dates: List[date] = []
+        self._names: List[str] = []
+        self._first_year = None
+
+    def build(self, start_year: int):
+        """Compute every holiday for ``years`` years starting at ``start_year``"""
+        entries = sorted(
+            (holiday_date(rule, year), name)
+            for year in range(start_year, start_year + self.years)
+            for name, rule in self.holidays.items()
+        )
+        self._dates = [entry[0] for entry in entries]
+        self._names = [entry[1] for entry in entries]
+        self._first_year = start_year
+
+    def _ensure_window(self, today: date):
+        """Rebuild the window when today falls outside its final year"""
+        if self._first_year is None or not self._first_year <= today.year < self._first_year + self.years - 1:
+            self.build(today.year)
+
+    def next_holiday(self, today: Optional[date] = None) -> Tuple[str, date]:
+        """Get the first holiday on or after today"""
+        today = today or date.today()
+        self._ensure_window(today)
+        index = bisect_left(self._dates, today)
+        return self._names[index], self._dates[index]
+
+    def next_holiday_after(self, today: Optional[date] = None) -> Tuple[str, date]:
+        """Get the first holiday strictly after today"""
+        today = today or date.today()
+        return self.next_holiday(today + timedelta(days=1))
+
+    def holidays_on(self, day: Optional[date] = None) -> List[str]:
+        """Get the names of all holidays falling on a day"""
+        day = day or date.today()
+        self._ensure_window(day)
+        index = bisect_left(self._dates, day)
+        names = []
+        while index < len(self._dates) and self._dates[index] == day:
+            names.append(self._names[index])
+            index += 1
+        return names
@@ -0,0 +1,35 @@
+# utils/members.py
+import asyncio
+from typing import Dict, Iterable
+import discord
+from config.constants import BIRTHDAY_SETTINGS
+
+async def fetch_members(guild: discord.Guild, user_ids: Iterable[int],
+                        batch_size: int = BIRTHDAY_SETTINGS['member_query_batch']) -> Dict[int, discord.Member]:
+    """Get members by ID, from the cache where possible and in batched gateway queries otherwise
+
+    Users that aren't in the guild are left out. Where the guild's member
+    list is fully cached, nothing is queried. Queried members are not
+    added to the cache, so this works the same in the low-memory mode.
+    """
+    found = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        member = guild.get_member(user_id)
+        if member is not None:
+            found[user_id] = member
+        else:
+            missing.append(user_id)
+    if guild.chunked:
+        # The full member list is cached, so anyone missing from it has left the guild
+        return found
+
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        try:
+            members = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+        except asyncio.TimeoutError:
+            print(f"Timed out looking up {len(batch)} members in guild {guild.name}")
+            continue
+        found.update((member.id, member) for member in members)
+    return found
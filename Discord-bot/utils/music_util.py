@@ -1,58 +1,502 @@
 # utils/music_utils.py
 import discord
-import yt_dlp
 import asyncio
+import shlex
+import time
 from typing import Optional, Dict, Any
-from config.settings import YTDL_OPTIONS, FFMPEG_OPTIONS
+from config.settings import FFMPEG_OPTIONS
+from config.constants import MUSIC_SETTINGS, EXTRACTION_SETTINGS, VISUALIZER
+from utils.extraction import extract_info, stream_expiry
+from utils.track_queue import TrackQueue
+from utils.visualizer import SpectrumAnalyzer
+from utils.effects import AudioEffects, EffectsChain
+from utils.audio_cache import audio_cache
+from utils.voice_workers import voice_pool, ffmpeg_args, input_options
 import random
 
-class YTDLSource(discord.PCMVolumeTransformer):
-    """A custom audio source class for handling YouTube downloads and streaming"""
-    
-    def __init__(self, source: discord.AudioSource, *, data: Dict[str, Any], volume: float = 0.5):
-        super().__init__(source, volume)
+class TrackSource:
+    """Track metadata and playback bookkeeping shared by the PCM and Opus sources"""
+
+    speed = 1.0
+    transforms = True  # applies volume and effects, so it needs the decoded PCM
+    analyzer: Optional[SpectrumAnalyzer] = None
+
+    def _set_track_info(self, data: Dict[str, Any], filename: Optional[str], start: float, opus: bool,
+                        local: bool = False):
         self.data = data
+        self.filename = filename or data.get('url')
+        self.start = start
+        self.opus = opus  # the input is Opus and can be passed through undecoded
+        self.local = local  # the input is a file from the audio cache, not a stream URL
         self.title = data.get('title')
         self.url = data.get('url')
         self.duration = data.get('duration')
         self.thumbnail = data.get('thumbnail')
         self.webpage_url = data.get('webpage_url')
         self.uploader = data.get('uploader')
+        self.created_at = time.monotonic()
+        self.expires_at = stream_expiry(data)
+        self.frames = 0
+
+    @property
+    def position(self) -> float:
+        """Seconds into the track that have been handed to the voice client"""
+        return self.start + self.frames * discord.opus.Encoder.FRAME_LENGTH / 1000 * self.speed
+
+    def url_expiring(self) -> bool:
+        """Check whether the signed stream URL is about to expire"""
+        return bool(self.expires_at) and self.expires_at - time.time() < EXTRACTION_SETTINGS['stream_url_margin']
+
+    def effects_changed(self):
+        """Pick up changed effect settings; local sources read them on every frame"""
+
+    def is_stale(self) -> bool:
+        """Check whether the stream URL or the idle FFmpeg process is too old to play cleanly"""
+        return self.url_expiring() or time.monotonic() - self.created_at > MUSIC_SETTINGS['prefetch_max_age']
+
+    async def seek(self, position: float, *, guild_id: Optional[int] = None,
+                   effects: Optional[AudioEffects] = None, volume: float = 0.5,
+                   passthrough: bool = False) -> 'TrackSource':
+        """A new source for this track starting at ``position``
+
+        The stream URL (or cached file) already known is reused, so this
+        only respawns FFmpeg; the extractor runs again only if the URL is
+        about to expire.
+        """
+        if self.url_expiring():
+            return await stream_source(self.webpage_url or self.url, guild_id=guild_id, effects=effects,
+                                       volume=volume, start=position, passthrough=passthrough)
+        return open_source(self.filename, data=self.data, guild_id=guild_id, effects=effects, volume=volume,
+                           start=position, local=self.local, opus=self.opus, passthrough=passthrough)
+
+class YTDLSource(TrackSource, discord.PCMVolumeTransformer):
+    """A custom audio source class for handling YouTube downloads and streaming"""
+    
+    def __init__(self, source: discord.AudioSource, *, data: Dict[str, Any], volume: float = 0.5,
+                 effects: Optional[AudioEffects] = None, filename: Optional[str] = None,
+                 start: float = 0.0, local: bool = False, opus: bool = False):
+        super().__init__(source, volume)
+        self._set_track_info(data, filename, start, opus, local)
+        self.effects = effects or AudioEffects()
+        self.chain = EffectsChain(self.effects)
+        # Timeline effects are baked into the FFmpeg process when it is spawned
+        self.speed = self.effects.speed
+
+    def read(self) -> bytes:
+        """Read one 20ms frame, apply volume and effects, and count it towards the position"""
+        data = self.original.read()
+        if data:
+            self.frames += 1
+            data = self.chain.process(data, min(self.volume, 2.0))
+            if self.analyzer:
+                self.analyzer.feed(data)
+        return data
 
     @classmethod
-    async def from_url(cls, url: str, *, loop: Optional[asyncio.AbstractEventLoop] = None, stream: bool = False):
-        """Creates a YTDLSource from a URL"""
-        loop = loop or asyncio.get_event_loop()
-        ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
+    def spawn(cls, filename: str, *, data: Dict[str, Any], effects: Optional[AudioEffects] = None,
+              start: float = 0.0, volume: float = 0.5, local: bool = False, opus: bool = False):
+        """Starts FFmpeg for already extracted track info, optionally from an offset"""
+        options = dict(FFMPEG_OPTIONS)
+        # Input seeking: FFmpeg jumps straight to the offset with a ranged request
+        options['before_options'] = shlex.join(input_options(start=start, local=local))
+        if effects and effects.ffmpeg_filter():
+            options['options'] = f"{options['options']} -af {effects.ffmpeg_filter()}"
+        return cls(discord.FFmpegPCMAudio(filename, **options), data=data, volume=volume,
+                   effects=effects, filename=filename, start=start, local=local, opus=opus)
 
-        try:
-            data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
-            if 'entries' in data:
-                # Take first item from a playlist
-                data = data['entries'][0]
+class OpusSource(TrackSource, discord.FFmpegOpusAudio):
+    """Copies Opus packets straight from FFmpeg to the voice client
 
-            filename = data['url'] if stream else ytdl.prepare_filename(data)
-            return cls(discord.FFmpegPCMAudio(filename, **FFMPEG_OPTIONS), data=data)
-        except Exception as e:
-            raise Exception(f"Error processing URL: {str(e)}")
+    Nothing is decoded or re-encoded, so volume and effects can't be
+    applied; the player only uses this source while both are neutral.
+    """
+
+    volume = 1.0
+    transforms = False
+
+    def __init__(self, filename: str, *, data: Dict[str, Any], start: float = 0.0, local: bool = False):
+        super().__init__(filename, codec='copy', before_options=shlex.join(input_options(start=start, local=local)),
+                         options=FFMPEG_OPTIONS['options'])
+        self._set_track_info(data, filename, start, True, local)
+
+    def read(self) -> bytes:
+        """Read one Opus packet (20ms), counting it towards the position"""
+        data = super().read()
+        if data:
+            self.frames += 1
+            if self.analyzer:
+                self.analyzer.feed_opus(data)
+        return data
+
+class RemoteSource(TrackSource, discord.AudioSource):
+    """Plays a track whose FFmpeg, effects and Opus encoding run in a voice worker process
+
+    The voice thread only forwards finished packets. Volume and effect
+    changes are sent on to the worker; in passthrough the worker copies
+    the Opus stream and, like OpusSource, can apply neither.
+    """
+
+    def __init__(self, filename: str, *, data: Dict[str, Any], guild_id: Optional[int] = None,
+                 effects: Optional[AudioEffects] = None, volume: float = 0.5, start: float = 0.0,
+                 local: bool = False, opus: bool = False, passthrough: bool = False):
+        self._set_track_info(data, filename, start, opus, local)
+        self.effects = effects or AudioEffects()
+        self.transforms = not (opus and passthrough)
+        self.speed = self.effects.speed if self.transforms else 1.0
+        self._volume = volume if self.transforms else 1.0
+        args = ffmpeg_args(filename, start=start, local=local, opus=not self.transforms,
+                           audio_filter=self.effects.ffmpeg_filter() if self.transforms else '')
+        self.stream = voice_pool.open(guild_id, args, opus=not self.transforms,
+                                      volume=self._volume, effects=self.effects)
+
+    @property
+    def volume(self) -> float:
+        return self._volume
+
+    @volume.setter
+    def volume(self, value: float):
+        self._volume = value
+        self.stream.set_volume(value)
+
+    def is_opus(self) -> bool:
+        return True
+
+    def read(self) -> bytes:
+        """Read one Opus packet (20ms) from the worker, counting it towards the position"""
+        packet, sample = self.stream.read()
+        if packet:
+            self.frames += 1
+            if self.analyzer and not self.transforms:
+                self.analyzer.feed_opus(packet)
+            elif sample is not None and self.analyzer:
+                self.analyzer.offer(sample)
+        return packet
+
+    def effects_changed(self):
+        if self.transforms:
+            self.stream.set_effects(self.effects)
+
+    def cleanup(self):
+        self.stream.close()
+
+def open_source(filename: str, *, data: Dict[str, Any], guild_id: Optional[int] = None,
+                effects: Optional[AudioEffects] = None, volume: float = 0.5, start: float = 0.0,
+                local: bool = False, opus: bool = False, passthrough: bool = False) -> TrackSource:
+    """Start FFmpeg for a track, passing Opus through untouched when nothing needs the PCM
+
+    ``local`` marks a file from the audio cache rather than a stream URL.
+    """
+    if voice_pool.enabled:
+        return RemoteSource(filename, data=data, guild_id=guild_id, effects=effects, volume=volume,
+                            start=start, local=local, opus=opus, passthrough=passthrough)
+    if opus and passthrough:
+        return OpusSource(filename, data=data, start=start, local=local)
+    return YTDLSource.spawn(filename, data=data, effects=effects, start=start, volume=volume,
+                            local=local, opus=opus)
+
+async def stream_source(url: str, *, guild_id: Optional[int] = None, effects: Optional[AudioEffects] = None,
+                        volume: float = 0.5, start: float = 0.0, passthrough: bool = False) -> TrackSource:
+    """Resolve a track's stream URL and start FFmpeg on it"""
+    try:
+        data = await extract_info(url, guild_id=guild_id)
+    except Exception as e:
+        raise Exception(f"Error processing URL: {str(e)}")
+    return open_source(data['url'], data=data, guild_id=guild_id, effects=effects, volume=volume,
+                       start=start, opus=data.get('acodec') == 'opus', passthrough=passthrough)
+
+class Track:
+    """Lightweight queue entry, materialized into an audio source only near the head of the queue"""
+
+    __slots__ = ('query', 'title', 'webpage_url', 'duration', 'requester', 'thumbnail', 'uploader', 'start')
+
+    def __init__(self, query: str, *, title: Optional[str] = None, webpage_url: Optional[str] = None,
+                 duration: Optional[int] = None, requester: Optional[discord.abc.User] = None,
+                 thumbnail: Optional[str] = None, uploader: Optional[str] = None, start: float = 0.0):
+        self.query = query
+        self.title = title or query
+        self.webpage_url = webpage_url
+        self.duration = duration
+        self.requester = requester
+        self.thumbnail = thumbnail
+        self.uploader = uploader
+        self.start = start  # offset to resume from, only for the next playback
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any], *, query: Optional[str] = None,
+                  requester: Optional[discord.abc.User] = None):
+        """Creates a Track from extracted info, keeping only what the queue needs"""
+        return cls(
+            query or data.get('webpage_url') or data.get('url'),
+            title=data.get('title'),
+            webpage_url=data.get('webpage_url'),
+            duration=data.get('duration'),
+            requester=requester,
+            thumbnail=data.get('thumbnail'),
+            uploader=data.get('uploader')
+        )
+
+    @classmethod
+    def from_flat(cls, entry: Dict[str, Any], *, requester: Optional[discord.abc.User] = None):
+        """Creates a Track from a flat playlist entry (resolved only when played)"""
+        url = entry.get('webpage_url') or entry.get('url')
+        duration = entry.get('duration')
+        return cls(
+            url,
+            title=entry.get('title'),
+            webpage_url=url,
+            duration=int(duration) if duration else None,
+            requester=requester,
+            uploader=entry.get('uploader') or entry.get('channel')
+        )
+
+    @property
+    def key(self) -> str:
+        """URL identifying this track for play counts and the audio cache"""
+        return self.webpage_url or self.query
+
+    def info(self) -> Dict[str, Any]:
+        """Track info in the shape of extracted data, for sources played from the cache"""
+        return {
+            'title': self.title,
+            'webpage_url': self.webpage_url,
+            'duration': self.duration,
+            'thumbnail': self.thumbnail,
+            'uploader': self.uploader
+        }
+
+    async def create_source(self, *, guild_id: Optional[int] = None, volume: float = 0.5,
+                            effects: Optional[AudioEffects] = None, passthrough: bool = False) -> TrackSource:
+        """Spawn FFmpeg for this track, from the audio cache or a freshly resolved stream URL"""
+        cached = audio_cache.lookup(self.key)
+        if cached:
+            return open_source(cached, data=self.info(), guild_id=guild_id, effects=effects, volume=volume,
+                               start=self.start, local=True, opus=True, passthrough=passthrough)
+
+        return await stream_source(self.webpage_url or self.query, guild_id=guild_id, effects=effects,
+                                   volume=volume, start=self.start, passthrough=passthrough)
 
 class MusicPlayer:
-    """Helper class for managing music playback and queue"""
+    """Per-guild player state machine
+
+    Each guild has exactly one player, registered in ``bot.music_players``
+    and driven by a single supervised ``player_loop`` task. Loop modes,
+    the idle timeout and cleanup are all handled here.
+    """
     
-    def __init__(self, bot):
+    def __init__(self, bot, guild: discord.Guild, channel: discord.abc.Messageable):
         self.bot = bot
-        self.queue = asyncio.Queue()
+        self.guild = guild
+        self.channel = channel
+        self.queue = TrackQueue()
         self.next_event = asyncio.Event()
         self.current = None
-        self.volume = 0.5
+        self.current_track: Optional[Track] = None
+        self.volume = MUSIC_SETTINGS['default_volume']
         self.loop_mode = 'off'  # Can be 'off', 'single', or 'queue'
-        self.voice = None
-        self._task = None
+        self.prefetch_depth = MUSIC_SETTINGS['prefetch_depth']
+        self.prefetched: Dict[Track, TrackSource] = {}
+        self.analyzer = SpectrumAnalyzer()
+        self.effects = AudioEffects()
+        self.ingest_task: Optional[asyncio.Task] = None
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._prefetch_again = False
+        self._skip_loop = False
+        self._rewinding = False
+        self._destroyed = False
+        self._task = self.bot.loop.create_task(self.player_loop())
+        self._task.add_done_callback(self._on_loop_done)
 
-    def generate_visualizer(self) -> str:
-        """Generates a simple ASCII visualizer"""
-        bars = ['▁', '▂', '▃', '▄', '▅', '▆', '▇', '█']
-        return ''.join(random.choice(bars) for _ in range(20))
+    @property
+    def voice(self) -> Optional[discord.VoiceClient]:
+        """The guild's current voice connection"""
+        return self.guild.voice_client
+
+    def schedule_prefetch(self):
+        """Run prefetch in the background, coalescing overlapping requests"""
+        if self._prefetch_task and not self._prefetch_task.done():
+            self._prefetch_again = True
+            return
+        self._prefetch_task = self.bot.loop.create_task(self._prefetch_worker())
+
+    async def _prefetch_worker(self):
+        """Prefetch until no further request arrived while it was running"""
+        self._prefetch_again = True
+        while self._prefetch_again and not self._destroyed:
+            self._prefetch_again = False
+            await self.prefetch()
+
+    async def prefetch(self):
+        """Warm the next queued tracks so the transition into them is gapless
+
+        Only the first ``prefetch_depth`` tracks get an audio source (and an
+        FFmpeg process); everything further back stays a plain Track. Warm
+        sources that went stale or fell out of the window are released.
+        """
+        window = self.queue.peek(self.prefetch_depth)
+        for track in list(self.prefetched):
+            if track not in window or self.prefetched[track].is_stale():
+                self.prefetched.pop(track).cleanup()
+
+        for track in window:
+            if track in self.prefetched:
+                continue
+            try:
+                source = await track.create_source(**self._source_options())
+            except Exception as e:
+                print(f"Error prefetching {track.title}: {e}")
+                continue
+
+            # The queue may have changed while resolving
+            if track in self.prefetched or track not in self.queue or self._destroyed:
+                source.cleanup()
+                continue
+            self.prefetched[track] = source
+
+    def passthrough(self) -> bool:
+        """Whether Opus input can skip decoding: full volume and no effects"""
+        return MUSIC_SETTINGS['opus_passthrough'] and self.volume == 1.0 and not self.effects.active()
+
+    def _source_options(self) -> Dict[str, Any]:
+        """Arguments for spawning a source that matches the current volume and effects"""
+        return {'guild_id': self.guild.id, 'volume': self.volume,
+                'effects': self.effects, 'passthrough': self.passthrough()}
+
+    def _matches_settings(self, source: TrackSource) -> bool:
+        """Whether a spawned source can render the current volume and effects"""
+        return source.speed == self.effects.speed and (source.transforms or self.passthrough())
+
+    async def materialize(self, track: Track) -> TrackSource:
+        """Get a playable source for a track, using the prefetched one when still fresh"""
+        source = self.prefetched.pop(track, None)
+        if source is not None and not source.is_stale() and self._matches_settings(source):
+            if source.transforms:
+                source.volume = self.volume
+            return source
+        if source is not None:
+            source.cleanup()
+        return await track.create_source(**self._source_options())
+
+    async def _refresh_sources(self):
+        """Respawn sources whose FFmpeg output no longer fits the volume and effects"""
+        for track, source in list(self.prefetched.items()):
+            if not self._matches_settings(source):
+                self.prefetched.pop(track).cleanup()
+        self.schedule_prefetch()
+        if self.current and not self._matches_settings(self.current):
+            await self.seek(self.current.position)
+
+    async def set_effect(self, name: str, value: Optional[str] = None):
+        """Change an audio effect; raises ValueError on invalid input"""
+        self.effects.apply(name, value)
+        for source in (self.current, *self.prefetched.values()):
+            if source is not None:
+                source.effects_changed()
+        await self._refresh_sources()
+
+    async def set_volume(self, volume: float):
+        """Change the volume, leaving Opus passthrough if the new volume needs decoding"""
+        self.volume = volume
+        if self.current and self.current.transforms:
+            self.current.volume = volume
+        await self._refresh_sources()
+
+    async def seek(self, position: float) -> bool:
+        """Continue the current track from ``position`` seconds, returning whether it worked"""
+        current = self.current
+        if current is None or self.voice is None:
+            return False
+        if current.duration:
+            position = min(position, max(current.duration - 1, 0))
+        source = await current.seek(max(position, 0), **self._source_options())
+
+        # The track may have ended or been skipped while FFmpeg was starting
+        if self.current is not current or self.voice is None or not (self.voice.is_playing() or self.voice.is_paused()):
+            source.cleanup()
+            return False
+        source.analyzer = self.analyzer
+        if not source.is_opus() and not self.voice.encoder:
+            # Playback started in passthrough, so the voice client has no encoder yet
+            self.voice.encoder = discord.opus.Encoder()
+        # Swapping the source resumes the player, so a paused track has to be paused again
+        paused = self.voice.is_paused()
+        self.voice.source = source
+        if paused:
+            self.voice.pause()
+        self.current = source
+        current.cleanup()
+        return True
+
+    async def save_position(self):
+        """Persist the current track and position so it can be resumed later"""
+        if self.current_track is None or self.current is None:
+            return
+        try:
+            await self.bot.db.save_playback_position(self.guild.id, self.current_track.query,
+                                                     self.current_track.title, self.current.position)
+        except Exception as e:
+            print(f"Error saving playback position for guild {self.guild.id}: {e}")
+
+    async def restore_position(self) -> Optional[Track]:
+        """Queue the saved track to resume where it stopped, returning it (None if nothing was saved)"""
+        saved = await self.bot.db.get_playback_position(self.guild.id)
+        if not saved:
+            return None
+        query, title, position = saved
+        await self.bot.db.clear_playback_position(self.guild.id)
+        track = Track(query, title=title, start=position)
+        self.queue.put_front(track)
+        return track
+
+    def clear_prefetched(self):
+        """Release every prefetched source"""
+        for source in self.prefetched.values():
+            source.cleanup()
+        self.prefetched.clear()
+
+    def skip(self):
+        """Stop the current track without re-queueing it for loop modes"""
+        if self.voice and (self.voice.is_playing() or self.voice.is_paused()):
+            self._skip_loop = True
+            self.voice.stop()
+
+    def stop(self):
+        """Clear the queue and stop playback"""
+        if self.ingest_task:
+            self.ingest_task.cancel()
+        self.queue.clear()
+        self.clear_prefetched()
+        self.skip()
+
+    def previous(self) -> Optional[Track]:
+        """Replay the most recently finished track, returning it (None without history)"""
+        if not self.queue.history:
+            return None
+        track = self.queue.history.pop()
+        if self.current_track is not None:
+            # Resume the interrupted track right after the previous one
+            self.queue.put_front(self.current_track)
+            self._rewinding = True
+            self.skip()
+        self.queue.put_front(track)
+        self.schedule_prefetch()
+        return track
+
+    def progress_bar(self, width: int = VISUALIZER['length']) -> str:
+        """Renders the current playback position as a text progress bar"""
+        position = int(self.current.position)
+        duration = self.current.duration
+        if not duration:
+            return f"▶ {self.format_duration(position)}"
+
+        filled = min(width - 1, int(position * width // duration))
+        bar = '━' * filled + '●' + '─' * (width - filled - 1)
+        return f"{bar} {self.format_duration(position)} / {self.format_duration(duration)}"
+
+    def display_key(self) -> tuple:
+        """Everything the now-playing embed shows, to detect when it actually changed"""
+        if not self.current:
+            return ()
+        return (self.current.title, self.analyzer.snapshot, self.progress_bar(), self.loop_mode)
 
     async def create_embed(self) -> discord.Embed:
         """Creates an embed for the currently playing song"""
@@ -66,8 +510,7 @@ class MusicPlayer:
             embed.add_field(name="Uploader", value=self.current.uploader)
         
         if self.current.duration:
-            minutes, seconds = divmod(self.current.duration, 60)
-            embed.add_field(name="Duration", value=f"{minutes}:{seconds:02d}")
+            embed.add_field(name="Duration", value=self.format_duration(self.current.duration))
         
         if self.current.webpage_url:
             embed.add_field(name="URL", value=f"[Click here]({self.current.webpage_url})")
@@ -75,8 +518,9 @@ class MusicPlayer:
         if self.current.thumbnail:
             embed.set_thumbnail(url=self.current.thumbnail)
 
-        visualizer = self.generate_visualizer()
-        embed.description = f"```{visualizer}```"
+        embed.description = f"```{self.analyzer.snapshot}\n{self.progress_bar()}```"
+        if self.loop_mode != 'off':
+            embed.set_footer(text=f"Loop: {self.loop_mode}")
         
         return embed
 
@@ -87,51 +531,119 @@ class MusicPlayer:
         while True:
             self.next_event.clear()
 
-            # Handle loop mode
-            if self.loop_mode == 'single' and self.current:
-                await self.queue.put(self.current)
-            elif self.loop_mode == 'queue' and self.current:
-                await self.queue.put(self.current)
-
             try:
-                async with asyncio.timeout(180):  # 3 minute timeout
-                    self.current = await self.queue.get()
+                track = await asyncio.wait_for(self.queue.get(), MUSIC_SETTINGS['timeout_duration'])
             except asyncio.TimeoutError:
-                return self.destroy(self.voice.guild)
+                if self.voice is None:
+                    # Never joined (e.g. only !queue or !loop was used): there's nothing to leave
+                    continue
+                await self.channel.send("Left the voice channel after being idle for a while. 👋")
+                return self.destroy()
 
-            self.current.source.volume = self.volume
-            self.voice.play(self.current.source, after=lambda _: self.bot.loop.call_soon_threadsafe(self.next_event.set))
-            await self.create_embed()
+            if self.voice is None:
+                return self.destroy()
+
+            try:
+                source = await self.materialize(track)
+            except Exception as e:
+                await self.channel.send(f"Skipping {track.title}: {e}")
+                continue
+
+            self.analyzer.reset()
+            source.analyzer = self.analyzer
+            audio_cache.record_play(track.key)
+            self.current = source
+            self.current_track = track
+            # A resume offset only applies once; loop modes replay from the start
+            track.start = 0.0
+            self.voice.play(source, after=self._after_track)
+            self.schedule_prefetch()
             await self.next_event.wait()
 
-    def destroy(self, guild: discord.Guild):
+            # Seeking may have swapped the source while it played
+            self.current.cleanup()
+            self.current = None
+            self.current_track = None
+
+            # Going back re-queues the track itself, so it isn't history yet
+            if not self._rewinding:
+                self.queue.record(track)
+
+            # Handle loop mode (a skip always moves on)
+            if not self._skip_loop:
+                if self.loop_mode == 'single':
+                    self.queue.put_front(track)
+                elif self.loop_mode == 'queue':
+                    self.queue.put(track)
+            self._skip_loop = False
+            self._rewinding = False
+
+    def _after_track(self, error: Optional[Exception]):
+        """Voice thread callback fired when a track ends"""
+        if error:
+            print(f"Player error in guild {self.guild.id}: {error}")
+        self.bot.loop.call_soon_threadsafe(self.next_event.set)
+
+    def _on_loop_done(self, task: asyncio.Task):
+        """Supervise the player loop: report crashes and always clean up"""
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            print(f"Player loop crashed in guild {self.guild.id}: {error!r}")
+        self.destroy()
+
+    def destroy(self):
         """Cleanup resources"""
-        return self.bot.loop.create_task(self._cleanup(guild))
+        if self._destroyed:
+            return None
+        self._destroyed = True
+        return self.bot.loop.create_task(self._cleanup())
 
-    async def _cleanup(self, guild: discord.Guild):
+    async def _cleanup(self):
         """Internal cleanup method"""
+        await self.save_position()
+        if self.ingest_task:
+            self.ingest_task.cancel()
+        if self._prefetch_task:
+            self._prefetch_task.cancel()
+        if not self._task.done():
+            self._task.cancel()
+        self.queue.clear()
+        self.clear_prefetched()
+
         try:
-            await guild.voice_client.disconnect()
+            await self.guild.voice_client.disconnect()
         except AttributeError:
             pass
 
-        try:
-            del self.bot.music_players[guild.id]
-        except KeyError:
-            pass
+        if self.bot.music_players.get(self.guild.id) is self:
+            del self.bot.music_players[self.guild.id]
+
+        message = self.bot.visualizer_messages.pop(self.guild.id, None)
+        if message:
+            try:
+                await message.delete()
+            except discord.HTTPException:
+                pass
 
     @staticmethod
-    def parse_duration(duration: str) -> int:
-        """Convert duration string to seconds"""
-        try:
-            # Handle MM:SS format
-            if ':' in duration:
-                minutes, seconds = duration.split(':')
-                return int(minutes) * 60 + int(seconds)
-            # Handle seconds format
-            return int(duration)
-        except ValueError:
-            return 0
+    def format_duration(seconds: int) -> str:
+        """Convert seconds to an M:SS (or H:MM:SS) string"""
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours:
+            return f"{hours}:{minutes:02d}:{seconds:02d}"
+        return f"{minutes}:{seconds:02d}"
+
+    @staticmethod
+    def parse_duration(duration: str) -> Optional[int]:
+        """Convert an H:MM:SS, M:SS or seconds string to seconds (None if it isn't one)"""
+        parts = duration.strip().split(':')
+        if len(parts) > 3 or not all(part.isdigit() for part in parts):
+            return None
+        seconds = 0
+        for part in parts:
+            seconds = seconds * 60 + int(part)
+        return seconds
 
 class QueueManager:
     """Helper class for managing the music queue"""
@@ -0,0 +1,60 @@
+# utils/roles.py
+import asyncio
+from typing import Dict, Set, Tuple
+import discord
+from config.constants import BIRTHDAY_SETTINGS
+from utils.database import Database
+from utils.members import fetch_members
+
+class RoleReconciler:
+    """Keeps a role's holders in sync with a desired set of members
+
+    Each run diffs the desired holders against the members that actually
+    have the role and only applies the delta. The current holders are the
+    recorded ones plus any cached in ``role.members``, looked up by ID, so
+    this works without the full member cache. What was applied is
+    recorded per guild, so running again for the same day and the same
+    desired set makes no API calls.
+    """
+
+    def __init__(self, db: Database, concurrency: int = BIRTHDAY_SETTINGS['role_concurrency']):
+        self.db = db
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.applied: Dict[int, Tuple[str, frozenset]] = {}
+
+    async def reconcile(self, guild: discord.Guild, role: discord.Role,
+                        desired_ids: Set[int], day: str) -> Tuple[int, int]:
+        """Apply the role to exactly the desired members, returning (added, removed)"""
+        desired_ids = frozenset(desired_ids)
+        if self.applied.get(guild.id) == (day, desired_ids):
+            return 0, 0
+
+        recorded = await self.db.get_birthday_role_holders(guild.id)
+        members = {member.id: member for member in role.members}
+        members.update(await fetch_members(guild, (desired_ids | recorded) - members.keys()))
+        # Members that left are dropped; a role removed by hand shows up in the member's roles
+        current = {user_id: member for user_id, member in members.items() if role in member.roles}
+        to_add = [members[user_id] for user_id in desired_ids - current.keys() if user_id in members]
+        to_remove = [current[user_id] for user_id in current.keys() - desired_ids]
+
+        added = await asyncio.gather(*(self._apply(member.add_roles, role) for member in to_add))
+        removed = await asyncio.gather(*(self._apply(member.remove_roles, role) for member in to_remove))
+
+        # Record the holders we ended up with, including any call that failed
+        holders = set(current)
+        holders.difference_update(member.id for member, ok in zip(to_remove, removed) if ok)
+        holders.update(member.id for member, ok in zip(to_add, added) if ok)
+        await self.db.set_birthday_role_holders(guild.id, holders)
+
+        if all(added) and all(removed):
+            self.applied[guild.id] = (day, desired_ids)
+        return sum(added), sum(removed)
+
+    async def _apply(self, method, role: discord.Role) -> bool:
+        """Run one add/remove call under the concurrency limit"""
+        async with self.semaphore:
+            try:
+                await method(role, reason="Birthday role")
+                return True
+            except discord.HTTPException:
+                return False
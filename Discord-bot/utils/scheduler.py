@@ -0,0 +1,32 @@
+# utils/scheduler.py
+from datetime import date, datetime, timedelta, tzinfo
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+def resolve_timezone(name: Optional[str]) -> Optional[tzinfo]:
+    """Get a tzinfo for an IANA timezone name (None means the host's local time)"""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+def local_now(tz: Optional[tzinfo] = None) -> datetime:
+    """Get the current aware time in a timezone (the host's local time by default)"""
+    return datetime.now(tz).astimezone(tz)
+
+def local_today(tz: Optional[tzinfo] = None) -> date:
+    """Get the current date in a timezone"""
+    return local_now(tz).date()
+
+def start_of_day(day: date, tz: Optional[tzinfo] = None) -> datetime:
+    """Get midnight at the start of a day in a timezone as an aware datetime"""
+    midnight = datetime(day.year, day.month, day.day, tzinfo=tz)
+    # Resolve the wall-clock time (and the host zone when tz is None) to an aware instant
+    return midnight.astimezone(tz) if tz else midnight.astimezone()
+
+def next_midnight(tz: Optional[tzinfo] = None, now: Optional[datetime] = None) -> datetime:
+    """Get the next midnight boundary in a timezone as an aware datetime"""
+    now = now or local_now(tz)
+    return start_of_day(now.date() + timedelta(days=1), tz)
@@ -0,0 +1,105 @@
+# utils/settings_cache.py
+from typing import Any, Callable, Dict, Optional
+from utils.database import Database
+
+class GuildSettingsCache:
+    """Read-through cache in front of the per-guild channel and role settings
+
+    Every setting is loaded once at startup. Reads are served from memory,
+    and a write through one of the ``set_*`` methods invalidates the cached
+    value so the next read goes back to the database.
+    """
+
+    SETTINGS = ('birthday_channel', 'birthday_role', 'holiday_channel', 'timezone', 'prefetch_depth')
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._values: Dict[str, Dict[int, Any]] = {name: {} for name in self.SETTINGS}
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self, owns_guild: Optional[Callable[[int], bool]] = None):
+        """Load stored settings into memory, only for the guilds ``owns_guild`` accepts if given"""
+        loaded = {
+            'birthday_channel': await self.db.get_birthday_channels(),
+            'birthday_role': await self.db.get_birthday_roles(),
+            'holiday_channel': await self.db.get_holiday_channels(),
+            'timezone': await self.db.get_timezones(),
+            'prefetch_depth': await self.db.get_prefetch_depths()
+        }
+        for name, values in loaded.items():
+            if owns_guild is not None:
+                values = {guild_id: value for guild_id, value in values.items() if owns_guild(guild_id)}
+            self._values[name] = values
+
+    async def get(self, name: str, guild_id: int):
+        """Get a setting for a guild, reading through to the database on a miss"""
+        values = self._values[name]
+        if guild_id in values:
+            self.hits += 1
+            return values[guild_id]
+
+        # Cache misses (including missing rows) so unset guilds stay cheap
+        self.misses += 1
+        value = await getattr(self.db, f'get_{name}')(guild_id)
+        values[guild_id] = value
+        return value
+
+    async def set(self, name: str, guild_id: int, value):
+        """Store a setting for a guild and invalidate its cached value"""
+        await getattr(self.db, f'set_{name}')(guild_id, value)
+        self.invalidate(name, guild_id)
+
+    def invalidate(self, name: str, guild_id: int):
+        """Drop a cached value so the next read hits the database"""
+        self._values[name].pop(guild_id, None)
+
+    def stats(self) -> dict:
+        """Get cache hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': sum(len(values) for values in self._values.values())
+        }
+
+    async def get_birthday_channel(self, guild_id: int) -> Optional[int]:
+        """Get birthday announcement channel for a guild"""
+        return await self.get('birthday_channel', guild_id)
+
+    async def set_birthday_channel(self, guild_id: int, channel_id: int):
+        """Set birthday announcement channel for a guild"""
+        await self.set('birthday_channel', guild_id, channel_id)
+
+    async def get_birthday_role(self, guild_id: int) -> Optional[int]:
+        """Get birthday role for a guild"""
+        return await self.get('birthday_role', guild_id)
+
+    async def set_birthday_role(self, guild_id: int, role_id: int):
+        """Set birthday role for a guild"""
+        await self.set('birthday_role', guild_id, role_id)
+
+    async def get_holiday_channel(self, guild_id: int) -> Optional[int]:
+        """Get holiday announcement channel for a guild"""
+        return await self.get('holiday_channel', guild_id)
+
+    async def set_holiday_channel(self, guild_id: int, channel_id: int):
+        """Set holiday announcement channel for a guild"""
+        await self.set('holiday_channel', guild_id, channel_id)
+
+    async def get_timezone(self, guild_id: int) -> Optional[str]:
+        """Get the timezone for a guild"""
+        return await self.get('timezone', guild_id)
+
+    async def set_timezone(self, guild_id: int, timezone: str):
+        """Set the timezone for a guild"""
+        await self.set('timezone', guild_id, timezone)
+
+    async def get_prefetch_depth(self, guild_id: int) -> Optional[int]:
+        """Get how many upcoming tracks are prefetched for a guild"""
+        return await self.get('prefetch_depth', guild_id)
+
+    async def set_prefetch_depth(self, guild_id: int, depth: int):
+        """Set how many upcoming tracks are prefetched for a guild"""
+        await self.set('prefetch_depth', guild_id, depth)
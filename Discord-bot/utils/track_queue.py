@@ -0,0 +1,94 @@
+# utils/track_queue.py
+import asyncio
+import random
+from collections import deque
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Tuple
+from config.constants import MUSIC_SETTINGS
+
+class TrackQueue:
+    """Upcoming tracks for one player, plus a bounded history of played ones
+
+    Appending and popping at either end is O(1). Indexed access, remove and
+    move work on 0-based positions; callers showing positions to users
+    translate from 1-based. ``get`` waits for an item like ``asyncio.Queue``
+    but assumes a single consumer (the player loop).
+    """
+
+    def __init__(self, history_size: int = MUSIC_SETTINGS['history_size']):
+        self._items: deque = deque()
+        self.history: deque = deque(maxlen=history_size)
+        self._not_empty = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._items)
+
+    def __getitem__(self, index: int) -> Any:
+        return self._items[index]
+
+    def __contains__(self, item) -> bool:
+        return item in self._items
+
+    def put(self, item: Any):
+        """Add a track to the end of the queue"""
+        self._items.append(item)
+        self._not_empty.set()
+
+    def put_front(self, item: Any):
+        """Add a track to the head of the queue so it plays next"""
+        self._items.appendleft(item)
+        self._not_empty.set()
+
+    def extend(self, items: Iterable[Any]):
+        """Add several tracks to the end of the queue"""
+        self._items.extend(items)
+        if self._items:
+            self._not_empty.set()
+
+    async def get(self) -> Any:
+        """Remove and return the head of the queue, waiting until one is available"""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self._items.popleft()
+
+    def peek(self, count: int) -> List[Any]:
+        """The first ``count`` tracks, without removing them"""
+        return list(islice(self._items, count))
+
+    def remove(self, index: int) -> Any:
+        """Remove and return the track at ``index``"""
+        item = self._items[index]
+        del self._items[index]
+        return item
+
+    def move(self, source: int, destination: int) -> Any:
+        """Move the track at ``source`` so it ends up at ``destination``"""
+        item = self.remove(source)
+        self._items.insert(destination, item)
+        return item
+
+    def shuffle(self):
+        """Shuffle the upcoming tracks"""
+        items = list(self._items)
+        random.shuffle(items)
+        self._items = deque(items)
+
+    def clear(self):
+        """Drop every upcoming track (history is kept)"""
+        self._items.clear()
+
+    def record(self, item: Any):
+        """Remember a track that finished playing"""
+        self.history.append(item)
+
+    def page(self, number: int, size: int) -> Tuple[List[Tuple[int, Any]], int]:
+        """One page of upcoming tracks as (1-based position, track) pairs, plus the page count"""
+        pages = max(1, -(-len(self._items) // size))
+        number = min(max(number, 1), pages)
+        start = (number - 1) * size
+        entries = list(enumerate(islice(self._items, start, start + size), start + 1))
+        return entries, pages
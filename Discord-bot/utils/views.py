@@ -2,6 +2,7 @@
 import discord
 from discord.ui import Button, View, Select
 from typing import Optional, Callable
+from config.constants import MUSIC_SETTINGS
 
 class VolumeSlider(Select):
     """Volume control dropdown menu"""
@@ -19,9 +20,16 @@ class VolumeSlider(Select):
 
     async def callback(self, interaction: discord.Interaction):
         volume = int(self.values[0])
-        if interaction.guild.voice_client:
-            interaction.guild.voice_client.source.volume = volume / 100
-            await interaction.response.send_message(
+        player = interaction.client.music_players.get(interaction.guild.id)
+        if interaction.guild.voice_client and player:
+            # Switching in or out of passthrough respawns FFmpeg, which can outlast the interaction deadline
+            await interaction.response.defer(ephemeral=True)
+            try:
+                await player.set_volume(volume / 100)
+            except Exception as e:
+                await interaction.followup.send(f"Could not change volume: {e}", ephemeral=True)
+                return
+            await interaction.followup.send(
                 f"Changed volume to {volume}%",
                 ephemeral=True
             )
@@ -31,12 +39,50 @@ class VolumeSlider(Select):
                 ephemeral=True
             )
 
+class EffectsSelect(Select):
+    """Audio effects dropdown menu"""
+    def __init__(self):
+        options = [
+            discord.SelectOption(label="Normalize", value="normalize", description="Toggle loudness leveling"),
+            discord.SelectOption(label="Bass Boost", value="bass", description="Cycle the bass boost level"),
+            discord.SelectOption(label="Nightcore", value="nightcore", description="Toggle sped-up nightcore mode"),
+            discord.SelectOption(label="Reset", value="reset", description="Turn all effects off")
+        ]
+        super().__init__(
+            placeholder="Audio effects",
+            min_values=1,
+            max_values=1,
+            options=options
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        player = interaction.client.music_players.get(interaction.guild.id)
+        if player is None:
+            await interaction.response.send_message(
+                "Nothing is playing right now.",
+                ephemeral=True
+            )
+            return
+
+        # Changing the timeline respawns FFmpeg, which can outlast the interaction deadline
+        await interaction.response.defer(ephemeral=True)
+        try:
+            await player.set_effect(self.values[0])
+        except Exception as e:
+            await interaction.followup.send(f"Could not change effects: {e}", ephemeral=True)
+            return
+        await interaction.followup.send(
+            f"Active effects: {player.effects.describe()}",
+            ephemeral=True
+        )
+
 class MusicControlView(View):
     """Music control panel with buttons"""
     def __init__(self, ctx):
         super().__init__(timeout=None)
         self.ctx = ctx
         self.add_item(VolumeSlider())
+        self.add_item(EffectsSelect())
 
     @discord.ui.button(label="▶️ Play/Pause", style=discord.ButtonStyle.primary, emoji="⏯️")
     async def play_pause(self, interaction: discord.Interaction, button: Button):
@@ -70,7 +116,11 @@ class MusicControlView(View):
             )
             return
         
-        interaction.guild.voice_client.stop()
+        player = interaction.client.music_players.get(interaction.guild.id)
+        if player:
+            player.skip()
+        else:
+            interaction.guild.voice_client.stop()
         await interaction.response.send_message("Skipped the current song.")
 
     @discord.ui.button(label="Stop", style=discord.ButtonStyle.danger, emoji="⏹️")
@@ -82,8 +132,11 @@ class MusicControlView(View):
             )
             return
 
-        interaction.guild.voice_client.stop()
-        self.ctx.bot.queue.clear()
+        player = interaction.client.music_players.get(interaction.guild.id)
+        if player:
+            player.stop()
+        else:
+            interaction.guild.voice_client.stop()
         await interaction.response.send_message("Playback stopped and queue cleared.")
 
     @discord.ui.button(label="Queue", style=discord.ButtonStyle.secondary, emoji="📜")
@@ -96,16 +149,18 @@ class MusicControlView(View):
             )
             return
         
+        player = interaction.client.music_players.get(interaction.guild.id)
         current_song = interaction.guild.voice_client.source.title
         queue_list = f"Currently playing: {current_song}\n\nUpcoming songs:\n"
         
-        if len(self.ctx.bot.queue) == 0:
+        # Only the first page, like !queue: a long queue would not fit in one message
+        entries, pages = player.queue.page(1, MUSIC_SETTINGS['queue_page_size']) if player else ([], 1)
+        if not entries:
             queue_list += "No songs in the queue."
         else:
-            queue_list += "\n".join(
-                f"{i+1}. {song.title}" 
-                for i, song in enumerate(self.ctx.bot.queue)
-            )
+            queue_list += "\n".join(f"{i}. {song.title}" for i, song in entries)
+            if pages > 1:
+                queue_list += f"\n\n…and {len(player.queue) - len(entries)} more. Use `!queue <page>` to see them."
         
         await interaction.response.send_message(queue_list, ephemeral=True)
 
@@ -0,0 +1,195 @@
+# utils/visualizer.py
+import asyncio
+import time
+from typing import Dict, Optional
+import discord
+import numpy as np
+from config.constants import VISUALIZER
+
+class SpectrumAnalyzer:
+    """Turns the PCM frames a player sends into a row of level bars
+
+    The audio thread only calls ``feed``, which keeps a reference to every
+    ``sample_every``-th frame. The FFT runs later in ``update`` on the
+    event loop, and its result is published as an immutable string in
+    ``snapshot``, so readers never need a lock. Opus passthrough sources
+    call ``feed_opus`` instead; only the sampled packets get decoded.
+    """
+
+    def __init__(self, bands: int = VISUALIZER['length']):
+        self.bands = bands
+        self.snapshot = VISUALIZER['bars'][0] * bands
+        self._pending: Optional[bytes] = None
+        self._pending_packet: Optional[bytes] = None
+        self._decoder = None
+        self._frames = 0
+        self._levels = np.zeros(bands)
+        self._window = None
+        self._edges = None
+
+    def feed(self, frame: bytes):
+        """Offer a 20ms 48kHz stereo s16le frame; called from the audio thread"""
+        self._frames += 1
+        if self._frames % VISUALIZER['sample_every'] == 0:
+            self._pending = frame
+
+    def feed_opus(self, packet: bytes):
+        """Offer a 20ms Opus packet from a passthrough source; called from the audio thread"""
+        self._frames += 1
+        if self._frames % VISUALIZER['sample_every'] == 0:
+            self._pending_packet = packet
+
+    def offer(self, frame: bytes):
+        """Offer a frame that was already picked for analysis, e.g. by a voice worker"""
+        self._pending = frame
+
+    def reset(self):
+        """Drop levels left over from the previous track"""
+        self._pending = None
+        self._pending_packet = None
+        self._levels = np.zeros(self.bands)
+        self.snapshot = VISUALIZER['bars'][0] * self.bands
+
+    def update(self) -> str:
+        """Analyze the latest sampled frame, if any, and return the snapshot"""
+        frame, self._pending = self._pending, None
+        packet, self._pending_packet = self._pending_packet, None
+        if frame is None and packet is not None:
+            frame = self._decode(packet)
+        if not frame:
+            return self.snapshot
+
+        # Mono mix, then decimate: the bars don't need more than ~12kHz of bandwidth
+        samples = np.frombuffer(frame, dtype=np.int16).reshape(-1, 2).mean(axis=1)
+        samples = samples[::VISUALIZER['downsample']]
+        if self._window is None or len(self._window) != len(samples):
+            self._prepare(len(samples))
+
+        spectrum = np.abs(np.fft.rfft(samples * self._window))
+        energy = np.add.reduceat(spectrum ** 2, self._edges)
+        levels = np.clip((10 * np.log10(energy + 1e-9) - VISUALIZER['floor_db']) / VISUALIZER['range_db'], 0, 1)
+
+        # Bars fall gradually instead of flickering between frames
+        self._levels = np.maximum(levels, self._levels * VISUALIZER['decay'])
+        bars = VISUALIZER['bars']
+        indexes = (self._levels * (len(bars) - 1)).round().astype(int)
+        self.snapshot = ''.join(bars[i] for i in indexes)
+        return self.snapshot
+
+    def _decode(self, packet: bytes) -> Optional[bytes]:
+        """Decode a sampled Opus packet to PCM, or None if it can't be"""
+        if self._decoder is None:
+            try:
+                self._decoder = discord.opus.Decoder()
+            except discord.opus.OpusNotLoaded:
+                # Passthrough doesn't need libopus; without it the bars stay flat
+                self._decoder = False
+        if not self._decoder:
+            return None
+        try:
+            return self._decoder.decode(packet, fec=False)
+        except discord.opus.OpusError:
+            # e.g. the Ogg header packets at the start of a stream
+            return None
+
+    def _prepare(self, size: int):
+        """Precompute the window and log-spaced band edges for a frame size"""
+        self._window = np.hanning(size)
+        bins = size // 2 + 1
+        edges = np.geomspace(1, bins - self.bands, self.bands).astype(int)
+        # Low bands would share bins on a log scale; give each at least one of its own
+        self._edges = edges + np.arange(self.bands)
+
+class EditState:
+    """Per-guild bookkeeping for now-playing message edits"""
+
+    __slots__ = ('interval', 'due', 'last_key', 'task')
+
+    def __init__(self, interval: float, due: float):
+        self.interval = interval
+        self.due = due
+        self.last_key = None
+        self.task: Optional[asyncio.Task] = None
+
+class VisualizerScheduler:
+    """Keeps every guild's now-playing message up to date without flooding the API
+
+    A message is only edited when what it shows changed, and each guild
+    has its own edit interval: it backs off when edits come back slow or
+    rate limited and creeps back down while they stay fast. Guilds start
+    at different offsets so their edits are spread over the interval, and
+    due edits run concurrently up to a fixed limit.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.states: Dict[int, EditState] = {}
+        self.semaphore = asyncio.Semaphore(VISUALIZER['max_concurrent_edits'])
+
+    def tick(self):
+        """Start the edits that are due; called every VISUALIZER['tick'] seconds"""
+        now = time.monotonic()
+        for guild_id, message in list(self.bot.visualizer_messages.items()):
+            player = self.bot.music_players.get(guild_id)
+            if player is None or player.current is None:
+                continue
+
+            state = self.states.get(guild_id)
+            if state is None:
+                interval = VISUALIZER['update_interval']
+                # Spread the first edit of each guild across one interval
+                offset = (guild_id >> 22) % 1000 / 1000 * interval
+                state = self.states[guild_id] = EditState(interval, now + offset)
+
+            if state.task is not None or now < state.due:
+                continue
+            player.analyzer.update()
+            key = player.display_key()
+            if key == state.last_key:
+                continue
+            state.task = asyncio.create_task(self._edit(guild_id, message, player, state, key))
+
+        for guild_id in self.states.keys() - self.bot.visualizer_messages.keys():
+            state = self.states.pop(guild_id)
+            if state.task:
+                state.task.cancel()
+
+    async def _edit(self, guild_id: int, message: discord.Message, player, state: EditState, key: tuple):
+        """Edit one guild's message and adapt its interval to how the edit went"""
+        try:
+            async with self.semaphore:
+                started = time.monotonic()
+                await message.edit(embed=await player.create_embed())
+                elapsed = time.monotonic() - started
+            state.last_key = key
+
+            # discord.py sleeps through 429s itself, so a slow edit means the route is saturated
+            if elapsed > VISUALIZER['slow_edit']:
+                state.interval = min(state.interval * 2, VISUALIZER['max_interval'])
+            else:
+                state.interval = max(state.interval * 0.8, VISUALIZER['update_interval'])
+        except discord.NotFound:
+            # Message was deleted
+            self.bot.visualizer_messages.pop(guild_id, None)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                state.interval = min(state.interval * 2, VISUALIZER['max_interval'])
+            print(f"Error updating visualizer in guild {guild_id}: {e}")
+        finally:
+            state.due = time.monotonic() + state.interval
+            state.task = None
+
+    def stats(self) -> Dict[str, float]:
+        """Number of tracked guilds and their average edit interval"""
+        intervals = [state.interval for state in self.states.values()]
+        return {
+            'guilds': len(intervals),
+            'average_interval': sum(intervals) / len(intervals) if intervals else 0.0
+        }
+
+    def close(self):
+        """Cancel any edits still in flight"""
+        for state in self.states.values():
+            if state.task:
+                state.task.cancel()
+        self.states.clear()
@@ -0,0 +1,357 @@
+# utils/voice_workers.py
+import asyncio
+import multiprocessing
+import queue
+import shlex
+import signal
+import struct
+import subprocess
+import threading
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+import discord
+from discord.oggparse import OggStream
+from config.settings import FFMPEG_OPTIONS
+from config.constants import VISUALIZER, VOICE_WORKERS
+from utils.effects import AudioEffects, EffectsChain, FRAME_SIZE, SAMPLES_PER_FRAME
+
+# Worker -> bot messages: a kind byte and the stream ID, followed by the payload
+HEADER = struct.Struct('<cI')
+PACKET = b'P'  # one Opus packet
+SAMPLED = b'S'  # a PCM frame for the visualizer, then the Opus packet encoded from it
+END = b'E'  # the stream finished; the payload is an error message, if any
+
+def input_options(*, start: float = 0.0, local: bool = False) -> List[str]:
+    """FFmpeg options for the input; the HTTP reconnect flags are left out for a local file"""
+    args = ['-ss', f'{start:.2f}'] if start else []
+    options = iter(shlex.split(FFMPEG_OPTIONS['before_options']))
+    for option in options:
+        if local and option.startswith('-reconnect'):
+            # FFmpeg rejects these (and exits) on anything but a network input
+            next(options, None)
+            continue
+        args.append(option)
+    return args
+
+def ffmpeg_args(filename: str, *, start: float = 0.0, local: bool = False, opus: bool = False,
+                audio_filter: str = '') -> List[str]:
+    """FFmpeg command line writing raw PCM, or the Opus stream copied into Ogg, to stdout"""
+    args = ['ffmpeg', *input_options(start=start, local=local), '-i', filename]
+    if opus:
+        args += ['-map_metadata', '-1', '-f', 'opus', '-c:a', 'copy']
+    else:
+        args += ['-f', 's16le']
+    args += ['-ar', '48000', '-ac', '2', '-loglevel', 'warning', *shlex.split(FFMPEG_OPTIONS['options'])]
+    if audio_filter:
+        args += ['-af', audio_filter]
+    args.append('pipe:1')
+    return args
+
+class WorkerStream(threading.Thread):
+    """One track being read, processed and encoded inside a worker process
+
+    Each packet sent to the bot uses up a credit; the bot hands credits
+    back as the voice client plays packets, so the stream never runs more
+    than ``buffer_frames`` ahead of playback (and simply waits while the
+    player is paused).
+    """
+
+    def __init__(self, worker: 'VoiceWorker', stream_id: int, args: List[str], opus: bool,
+                 volume: float, effects: AudioEffects):
+        super().__init__(name=f'voice-stream-{stream_id}', daemon=True)
+        self.worker = worker
+        self.stream_id = stream_id
+        self.args = args
+        self.opus = opus
+        self.volume = volume
+        self.chain = EffectsChain(effects)
+        self.credits = threading.Semaphore(VOICE_WORKERS['buffer_frames'])
+        self.process: Optional[subprocess.Popen] = None
+        self.stopped = False
+
+    def run(self):
+        error = ''
+        try:
+            self.process = subprocess.Popen(self.args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL)
+            for kind, payload in self._copy() if self.opus else self._encode():
+                while not self.credits.acquire(timeout=1) and not self.stopped:
+                    pass
+                if self.stopped:
+                    break
+                self.worker.send(kind, self.stream_id, payload)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        finally:
+            self._kill()
+
+        if not self.stopped:
+            try:
+                self.worker.send(END, self.stream_id, error.encode())
+            except OSError:
+                pass
+
+    def _copy(self):
+        """Opus packets straight out of FFmpeg's Ogg output"""
+        for packet in OggStream(self.process.stdout).iter_packets():
+            yield PACKET, packet
+
+    def _encode(self):
+        """PCM frames through volume and effects, then into the Opus encoder"""
+        encoder = discord.opus.Encoder()
+        stdout = self.process.stdout
+        frames = 0
+        while True:
+            frame = stdout.read(FRAME_SIZE)
+            if len(frame) != FRAME_SIZE:
+                return
+            frame = self.chain.process(frame, min(self.volume, 2.0))
+            packet = encoder.encode(frame, SAMPLES_PER_FRAME)
+            frames += 1
+            if frames % VISUALIZER['sample_every'] == 0:
+                yield SAMPLED, frame + packet
+            else:
+                yield PACKET, packet
+
+    def stop(self):
+        """Abandon the stream; called from the worker's command loop"""
+        self.stopped = True
+        self.credits.release()
+        self._kill()
+
+    def _kill(self):
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+
+class VoiceWorker:
+    """Command loop of a worker process"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.streams: Dict[int, WorkerStream] = {}
+
+    def send(self, kind: bytes, stream_id: int, payload: bytes):
+        with self.lock:
+            self.conn.send_bytes(HEADER.pack(kind, stream_id) + payload)
+
+    def serve(self):
+        """Handle commands from the bot until told to shut down or the bot goes away"""
+        try:
+            while True:
+                command, stream_id, *args = self.conn.recv()
+                if command == 'shutdown':
+                    break
+                if command == 'open':
+                    stream = self.streams[stream_id] = WorkerStream(self, stream_id, *args)
+                    stream.start()
+                    continue
+
+                stream = self.streams.get(stream_id)
+                if stream is None:
+                    continue
+                if command == 'ack':
+                    stream.credits.release(args[0])
+                elif command == 'volume':
+                    stream.volume = args[0]
+                elif command == 'effects':
+                    stream.chain.effects = args[0]
+                elif command == 'close':
+                    del self.streams[stream_id]
+                    stream.stop()
+        except EOFError:
+            pass
+        finally:
+            for stream in self.streams.values():
+                stream.stop()
+
+def run_worker(conn):
+    """Entry point of a worker process"""
+    # Ctrl+C reaches the whole process group; the bot shuts its workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    VoiceWorker(conn).serve()
+
+class RemoteStream:
+    """Bot-side end of a stream running in a worker, read from the voice thread"""
+
+    def __init__(self, worker: 'WorkerHandle', stream_id: int):
+        self.worker = worker
+        self.stream_id = stream_id
+        self.packets: queue.Queue = queue.Queue()
+        self.error: Optional[str] = None
+        self._unacked = 0
+        self._done = False
+
+    def finish(self, error: Optional[str] = None):
+        """Mark the end of the stream; called from the worker's reader thread"""
+        self.error = error
+        self.packets.put((b'', None))
+
+    def read(self) -> Tuple[bytes, Optional[bytes]]:
+        """The next Opus packet and the PCM frame sampled with it, if any; an empty packet ends the stream"""
+        if self._done:
+            return b'', None
+        try:
+            packet, sample = self.packets.get(timeout=VOICE_WORKERS['read_timeout'])
+        except queue.Empty:
+            packet, sample, self.error = b'', None, 'voice worker stalled'
+
+        if not packet:
+            self._done = True
+            if self.error:
+                print(f"Voice stream {self.stream_id} ended early: {self.error}")
+            return b'', None
+
+        self._unacked += 1
+        if self._unacked >= VOICE_WORKERS['ack_every']:
+            self._send('ack', self._unacked)
+            self._unacked = 0
+        return packet, sample
+
+    def set_volume(self, volume: float):
+        self._send('volume', volume)
+
+    def set_effects(self, effects: AudioEffects):
+        self._send('effects', effects)
+
+    def close(self):
+        """Stop the worker side and forget the stream"""
+        self.worker.streams.pop(self.stream_id, None)
+        self._send('close')
+
+    def _send(self, command: str, *args):
+        try:
+            self.worker.send(command, self.stream_id, *args)
+        except (OSError, ValueError):
+            # The worker is gone; its reader thread already ended the stream
+            pass
+
+class WorkerHandle:
+    """Bot-side end of one worker process"""
+
+    def __init__(self, context, index: int):
+        self.index = index
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(child,), name=f'voice-worker-{index}', daemon=True)
+        self.process.start()
+        child.close()
+        self.lock = threading.Lock()
+        self.streams: Dict[int, RemoteStream] = {}
+        self.alive = True
+        self.reader = threading.Thread(target=self._read_loop, name=f'voice-worker-{index}-reader', daemon=True)
+        self.reader.start()
+
+    def send(self, *message):
+        """Send a command; called from the event loop and the voice threads"""
+        with self.lock:
+            self.conn.send(message)
+
+    def _read_loop(self):
+        """Route packets from the worker to their streams"""
+        try:
+            while True:
+                message = self.conn.recv_bytes()
+                kind, stream_id = HEADER.unpack_from(message)
+                stream = self.streams.get(stream_id)
+                if stream is None:
+                    continue
+                payload = message[HEADER.size:]
+                if kind == PACKET:
+                    stream.packets.put((payload, None))
+                elif kind == SAMPLED:
+                    stream.packets.put((payload[FRAME_SIZE:], payload[:FRAME_SIZE]))
+                else:
+                    stream.finish(payload.decode(errors='replace') or None)
+        except (EOFError, OSError):
+            pass
+
+        self.alive = False
+        for stream in list(self.streams.values()):
+            stream.finish('voice worker exited')
+        self.streams.clear()
+
+    def close(self, timeout: float):
+        """Ask the worker to exit, killing it if it doesn't in time"""
+        try:
+            self.send('shutdown', 0)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.reader.join(timeout)
+        self.conn.close()
+
+class VoiceWorkerPool:
+    """Processes that take FFmpeg reads, effects and Opus encoding off the bot process
+
+    Voice connections stay in the bot process, whose voice threads only
+    forward finished Opus packets, so the GIL there is no longer shared
+    with per-frame audio work. Each guild is served by one worker, picked
+    from its ID. Workers that die are restarted on the next track.
+    """
+
+    def __init__(self, processes: int = VOICE_WORKERS['processes']):
+        self.processes = processes
+        # A forked copy of the bot would inherit its event loop and threads
+        self.context = multiprocessing.get_context('spawn')
+        self.workers: List[Optional[WorkerHandle]] = [None] * processes
+        self._stream_ids = count(1)
+        self.opened = 0
+        self.restarts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def start(self):
+        """Start every worker up front so the first track doesn't wait for one"""
+        for index in range(self.processes):
+            self._worker(index)
+
+    def _worker(self, index: int) -> WorkerHandle:
+        worker = self.workers[index]
+        if worker is None or not worker.alive:
+            if worker is not None:
+                self.restarts += 1
+                print(f"Voice worker {index} exited, restarting it")
+            worker = self.workers[index] = WorkerHandle(self.context, index)
+        return worker
+
+    def worker_for(self, guild_id: Optional[int]) -> int:
+        """Index of the worker serving a guild"""
+        # The low bits of a snowflake vary independently of the shard (which uses the high bits)
+        return (guild_id or 0) % self.processes
+
+    def open(self, guild_id: Optional[int], args: List[str], *, opus: bool, volume: float,
+             effects: AudioEffects) -> RemoteStream:
+        """Start FFmpeg with ``args`` in the guild's worker"""
+        worker = self._worker(self.worker_for(guild_id))
+        stream = RemoteStream(worker, next(self._stream_ids))
+        worker.streams[stream.stream_id] = stream
+        worker.send('open', stream.stream_id, args, opus, volume, effects)
+        self.opened += 1
+        return stream
+
+    def stats(self) -> Dict[str, int]:
+        """Get worker and stream counters"""
+        workers = [worker for worker in self.workers if worker is not None]
+        return {
+            'processes': self.processes,
+            'alive': sum(worker.alive for worker in workers),
+            'streams': sum(len(worker.streams) for worker in workers),
+            'opened': self.opened,
+            'restarts': self.restarts
+        }
+
+    async def close(self):
+        """Shut every worker down"""
+        workers = [worker for worker in self.workers if worker is not None]
+        self.workers = [None] * self.processes
+        await asyncio.gather(*(asyncio.to_thread(worker.close, VOICE_WORKERS['shutdown_timeout'])
+                               for worker in workers))
+
+voice_pool = VoiceWorkerPool()